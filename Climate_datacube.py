@@ -0,0 +1,157 @@
+# Multi-year climate datacube shared by the climate and point pipelines
+import os
+import json
+import hashlib
+import numpy as np  # Memory-mapped array storage
+from osgeo import gdal, osr  # Reading the monthly climate stacks
+
+
+# Order of the bands in every Filled_Stacked_Climate.tif (and of the datacube's variable axis)
+CLIMATE_VARIABLES = ['u10', 'v10', 'd2m', 't2m', 'tp', 'lai_high']
+
+CUBE_FILE = 'climate_cube.npy'        # (time, variable, y, x) float32 values, NaN where missing
+METADATA_FILE = 'climate_cube.json'   # Time coordinate, per-month checksums, variables and grid georeferencing
+
+
+# -- Build the datacube from the monthly climate stacks
+def build_climate_datacube(stack_paths, cube_dir):
+    """
+    Writes every monthly climate stack into one memory-mappable (time, variable, y, x) array.
+    Months are stored in time order and each month is one contiguous block, so reading a
+    month touches a single region of the file and a pixel time series is one strided read.
+
+    Parameters:
+    - stack_paths (dict): Filled climate stack path for each (year, month_num).
+    - cube_dir (str): Folder where the datacube and its metadata are written.
+
+    Returns:
+    - str: Path to the datacube metadata file, or None if no stack could be read.
+    """
+    times = sorted(stack_paths)
+    if not times:
+        print("⚠️ No climate stacks to put in the datacube.")
+        return None
+
+    # The first stack defines the grid every other month must share
+    ds = gdal.Open(stack_paths[times[0]])
+    if ds is None:
+        print(f"❌ Could not open climate stack: {stack_paths[times[0]]}")
+        return None
+    n_rows, n_cols = ds.RasterYSize, ds.RasterXSize
+    geotransform = ds.GetGeoTransform()
+    projection = ds.GetProjection()
+    ds = None
+
+    os.makedirs(cube_dir, exist_ok=True)
+    cube_path = os.path.join(cube_dir, CUBE_FILE)
+    cube = np.lib.format.open_memmap(
+        cube_path, mode='w+', dtype=np.float32,
+        shape=(len(times), len(CLIMATE_VARIABLES), n_rows, n_cols)
+    )
+
+    time_coordinate = []
+    checksums = {}  # "YYYY-MM" -> hash of that month's values, so readers can tell which months changed
+    for t, (year, month_num) in enumerate(times):
+        ds = gdal.Open(stack_paths[(year, month_num)])
+        if ds is None or (ds.RasterYSize, ds.RasterXSize) != (n_rows, n_cols) or ds.RasterCount < len(CLIMATE_VARIABLES):
+            print(f"⚠️ {year}-{month_num:02d} stack is missing or not on the datacube grid. Stored as NaN.")
+            cube[t] = np.nan
+        else:
+            stack = ds.ReadAsArray()[:len(CLIMATE_VARIABLES)].astype(np.float32)
+            nodata = ds.GetRasterBand(1).GetNoDataValue()
+            if nodata is not None:
+                stack[stack == nodata] = np.nan
+            cube[t] = stack
+        ds = None
+        time_coordinate.append(f"{year}-{month_num:02d}")
+        checksums[time_coordinate[-1]] = hashlib.sha256(np.ascontiguousarray(cube[t]).tobytes()).hexdigest()[:16]
+
+    cube.flush()
+    del cube
+
+    metadata_path = os.path.join(cube_dir, METADATA_FILE)
+    with open(metadata_path, 'w') as f:
+        json.dump({
+            'time': time_coordinate,
+            'checksums': checksums,
+            'variables': CLIMATE_VARIABLES,
+            'geotransform': list(geotransform),
+            'projection': projection,
+            'geographic': bool(osr.SpatialReference(wkt=projection).IsGeographic())
+        }, f, indent=2)
+
+    print(f"✅ Climate datacube with {len(times)} months saved to: {cube_path}")
+    return metadata_path
+
+
+# -- Open the datacube without loading it into memory
+def open_climate_datacube(cube_dir):
+    """
+    Opens the datacube as a read-only memory map.
+
+    Returns:
+    - dict: 'data' (time, variable, y, x) memory map, 'time' index and 'checksums' value hash for each "YYYY-MM",
+      'variables', 'geotransform', 'projection' and 'geographic'. None if the datacube does not exist.
+      'checksums' is None for a datacube built before the hashes were stored.
+    """
+    cube_path = os.path.join(cube_dir, CUBE_FILE)
+    metadata_path = os.path.join(cube_dir, METADATA_FILE)
+    if not (os.path.exists(cube_path) and os.path.exists(metadata_path)):
+        return None
+
+    with open(metadata_path, 'r') as f:
+        metadata = json.load(f)
+
+    return {
+        'data': np.load(cube_path, mmap_mode='r'),
+        'time': {label: t for t, label in enumerate(metadata['time'])},
+        'checksums': metadata.get('checksums'),
+        'variables': metadata['variables'],
+        'geotransform': metadata['geotransform'],
+        'projection': metadata['projection'],
+        'geographic': metadata.get('geographic', False)
+    }
+
+
+# -- Slice a month
+def datacube_month(cube, year, month_num):
+    # Returns the (variable, y, x) values of one month, or None if the month is not in the datacube
+    t = cube['time'].get(f"{year}-{month_num:02d}")
+    return None if t is None else cube['data'][t]
+
+
+# -- Sample points across months
+def sample_climate_datacube(cube, years, month_nums, xs, ys):
+    """
+    Samples the datacube at many points from any months in one fancy-indexing operation.
+
+    Parameters:
+    - years, month_nums (array-like): Month of each point.
+    - xs, ys (array-like): Point coordinates in the datacube's CRS
+      (longitude/latitude when the stacks were kept on the native ERA5 grid).
+
+    Returns:
+    - np.ndarray: (points, variables) values, NaN for points outside the grid or in missing months.
+    """
+    data = cube['data']
+    x0, dx, _, y0, _, dy = cube['geotransform']
+    n_times, n_vars, n_rows, n_cols = data.shape
+
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    if cube['geographic']:
+        xs = np.where(xs < x0, xs + 360.0, xs)  # Grids stored as 0–360° longitudes
+
+    # Time index of each point: one lookup per distinct month, spread back to the points through the inverse index
+    month_keys = np.asarray(years, dtype=np.int64) * 12 + (np.asarray(month_nums, dtype=np.int64) - 1)
+    unique_keys, inverse = np.unique(month_keys, return_inverse=True)
+    unique_times = np.array([cube['time'].get(f"{key // 12}-{key % 12 + 1:02d}", -1) for key in unique_keys.tolist()],
+                            dtype=np.int64)
+    times = unique_times[inverse.ravel()]
+    cols = np.floor((xs - x0) / dx).astype(np.int64)
+    rows = np.floor((ys - y0) / dy).astype(np.int64)
+    valid = (times >= 0) & (cols >= 0) & (cols < n_cols) & (rows >= 0) & (rows < n_rows)
+
+    values = np.full((xs.size, n_vars), np.nan, dtype=np.float32)
+    values[valid] = data[times[valid], :, rows[valid], cols[valid]]
+    return values
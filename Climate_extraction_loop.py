@@ -1,142 +1,63 @@
 # Import necessary libraries and modules
-import processing  # QGIS processing framework
 import sys, os
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timezone, timedelta
-from qgis.analysis import QgsNativeAlgorithms  # QGIS built-in tools
 from osgeo import gdal  # GDAL: Geospatial Data Abstraction Library
-from processing.core.Processing import Processing
-from qgis.core import (
-    QgsVectorLayer, QgsProject, QgsProcessingContext, 
-    QgsProcessingFeedback, edit, QgsApplication, 
-    QgsProcessingFeatureSourceDefinition, QgsRasterLayer,
-    QgsRasterBandStats, QgsField, QgsFeature, QgsGeometry,
-    QgsPointXY, QgsVectorFileWriter, 
-    QgsCoordinateReferenceSystem, QgsProcessingProvider
-)
-from processing.algs.gdal.GdalAlgorithmProvider import GdalAlgorithmProvider
+import numpy as np  # Array handling for in-memory band stacks
+import Geo_backend  # Warp settings shared by both backends
+from Geo_backend import get_backend, write_stack  # GDAL (default) or QGIS geoprocessing
+from Climate_datacube import build_climate_datacube  # Multi-year climate datacube
+from Preprocessing_stage import run_preprocessing  # Shared BC boundary / fuel raster stage
 
 
-# === Initialize the QGIS processing environment ===
-Processing.initialize()
-
-# Add QGIS built-in tools and GDAL tools to the processing framework
-QgsApplication.processingRegistry().addProvider(QgsNativeAlgorithms())
-QgsApplication.processingRegistry().addProvider(GdalAlgorithmProvider())
-
-print("✅ GDAL Processing tools enabled.")
-
-
-# === Load shapefile of all Canadian provinces ===
+# === Paths to the input and output data ===
 base_dir = 'C:/Users/tdoa2/OneDrive/Desktop/Data analytics/BCIT Data Analytics Certificate/BABI 9050/Code/Spatial data analysis/Spatial data cleaning' # Base directory for data
-canada_provinces_path = os.path.join(base_dir, 'Map_of_Canada/lpr_000b16a_e.shp')  # Path to Canada shapefile
-canada_layer = QgsVectorLayer(canada_provinces_path, 'Canada Provinces', 'ogr')  # Load as vector layer using OGR driver
-
-# Check if the layer loaded successfully
-if not canada_layer.isValid():
-    print("❌ Canada provinces layer failed to load.")
-else:
-    print("✅ Canada provinces layer created.")
-
-
-# === Extract just the British Columbia (BC) boundary from the Canada shapefile ===
-bc_output_path = os.path.join(base_dir, 'Map_of_Canada/BC_boundary.shp')  # Output path for BC-only shapefile
-
-# Use QGIS attribute filter tool to extract BC where province abbreviation (PREABBR) = 'B.C.'
-processing.run("native:extractbyattribute", {
-    'INPUT': canada_layer,
-    'FIELD': 'PREABBR',
-    'OPERATOR': 0,  # 0 = equals
-    'VALUE': 'B.C.',
-    'OUTPUT': bc_output_path
-})
-print("✅ BC boundary extracted and saved to:", bc_output_path)
-
-
-# === Load the extracted BC boundary shapefile as a layer ===
-bc_boundary_layer = QgsVectorLayer(bc_output_path, 'BC Boundary', 'ogr')
-if bc_boundary_layer.isValid():
-    print("✅ BC Boundary layer created.")
-else:
-    print("❌ Failed to load BC Boundary layer.")
-
-
-# === Reproject the BC boundary to a new coordinate system (EPSG:3347 - NAD83 / BC Albers) ===
-reprojected_bc_boundary = os.path.join(base_dir, 'Map_of_Canada/BC_boundary_epsg3347.shp')  # New output path
-
-# Run the reprojection using QGIS processing tool
-processing.run("native:reprojectlayer", {
-    'INPUT': bc_output_path,
-    'TARGET_CRS': QgsCoordinateReferenceSystem('EPSG:3347'),  # New coordinate reference system
-    'OUTPUT': reprojected_bc_boundary
-})
-print("✅ Reprojected BC boundary to EPSG:3347")
-
-
-# === Load the reprojected BC boundary and add it to the QGIS project ===
-bc_boundary_layer_3347 = QgsVectorLayer(reprojected_bc_boundary, 'BC Boundary (EPSG:3347)', 'ogr')
-if bc_boundary_layer_3347.isValid():
-    QgsProject.instance().addMapLayer(bc_boundary_layer_3347)  # Add to current QGIS project
-    print("✅ Reprojected BC boundary layer created successfully.")
-else:
-    print("❌ Failed to load reprojected BC boundary layer.")
-
-
-# === Prepare to clip and reproject a fuel type raster to match the BC boundary ===
-fuel_raster_path = os.path.join(base_dir, 'National_FBP_Fueltypes_version2014b/nat_fbpfuels_2014b.tif')  # Original raster
-clipped_raster_temp = os.path.join(base_dir, 'National_FBP_Fueltypes_version2014b/temp_clipped_fuel.tif')  # Temp clipped raster
-final_clipped_raster = os.path.join(base_dir, 'National_FBP_Fueltypes_version2014b/BC_fuel_type_epsg3347.tif')  # Final reprojected output
-
-
-# === Clip the fuel raster to the reprojected BC boundary area ===
-processing.run("gdal:cliprasterbymasklayer", {
-    'INPUT': fuel_raster_path,  # Raster to be clipped
-    'MASK': reprojected_bc_boundary,  # Mask to clip against (BC boundary)
-    'SOURCE_CRS': None,
-    'TARGET_CRS': None,
-    'NODATA': -9999,  # Assign nodata value for areas outside the boundary
-    'ALPHA_BAND': False,
-    'CROP_TO_CUTLINE': True,
-    'KEEP_RESOLUTION': True,
-    'OPTIONS': '',
-    'DATA_TYPE': 0,
-    'EXTRA': '',
-    'OUTPUT': clipped_raster_temp
-})
-print("✅ Temporary clipped fuel raster created.")
-
-
-# === If the clipped raster exists, reproject it to match BC’s coordinate system ===
-if os.path.exists(clipped_raster_temp):
-    processing.run("gdal:warpreproject", {
-        'INPUT': clipped_raster_temp,
-        'SOURCE_CRS': None,
-        'TARGET_CRS': 'EPSG:3347',  # Project to BC Albers CRS
-        'RESAMPLING': 0,  # Use nearest neighbor resampling
-        'NODATA': None,
-        'TARGET_RESOLUTION': None,
-        'OPTIONS': '',
-        'DATA_TYPE': 0,
-        'TARGET_EXTENT': None,
-        'TARGET_EXTENT_CRS': None,
-        'MULTITHREADING': False,
-        'OUTPUT': final_clipped_raster
-    })
-    print("✅ Reprojected raster to EPSG:3347 successfully.")
-
-    # Load the final raster and add it to the project if it is valid
-    reprojected_layer = QgsRasterLayer(final_clipped_raster, "BC Fuel Type (EPSG:3347)")
-    if reprojected_layer.isValid():
+climate_cube_dir = os.path.join(base_dir, 'climate_data/Climate_datacube')  # Multi-year (time × variable × y × x) datacube
+reprojected_bc_boundary = None  # BC boundary in EPSG:3347, set from the shared preprocessing stage
+backend = None  # Geoprocessing backend ('gdal' or 'qgis', from BC_WILDFIRE_BACKEND), set by init_processing()
+
+
+# === Initialize the geoprocessing backend ===
+def init_processing(backend_name=None):
+    # The GDAL backend needs no QGIS application; the QGIS backend starts one only if it is selected
+    global backend
+    backend = get_backend(backend_name)
+    print(f"✅ {backend.name.upper()} geoprocessing backend enabled.")
+
+
+# === Shared preprocessing: BC boundary and BC fuel raster ===
+def prepare_inputs():
+    # The BC boundary and fuel raster are built once and reused by both scripts until one of their inputs changes
+    preprocessed = run_preprocessing(base_dir)
+    if preprocessed is None:
+        print("❌ Preprocessing of the BC boundary and fuel raster failed.")
+        return None
+
+    # Load the reprojected BC boundary (and add it to the QGIS project when running in QGIS)
+    if backend.load_vector(preprocessed['bc_boundary_3347'], 'BC Boundary (EPSG:3347)', add_to_project=True):
+        print("✅ Reprojected BC boundary layer created successfully.")
+    else:
+        print("❌ Failed to load reprojected BC boundary layer.")
+
+    # Load the BC fuel raster and add it to the project if it is valid
+    if backend.load_raster(preprocessed['fuel_raster'], "BC Fuel Type (EPSG:3347)", add_to_project=True):
         print("✅ Reprojected raster added to project.")
-        QgsProject.instance().addMapLayer(reprojected_layer)
     else:
         print("❌ Failed to load reprojected raster.")
-else:
-    print(f"❌ File not found: {clipped_raster_temp}")
+
+    return preprocessed
 
 
 # === PARAMETERS
 start_year = 2000  # Start year for processing data
 end_year = 2024    # End year for processing data (inclusive)
+climate_workers = os.cpu_count() or 1  # Worker processes for the clip/reproject/fill stage (1 = run serially)
+if sys.platform == 'win32':
+    climate_workers = min(climate_workers, 61)  # ProcessPoolExecutor allows at most 61 workers on Windows
+reproject_climate = False  # False keeps the climate stacks on the native ERA5 lat/lon grid; must match climate_sampling in Spatial_formatting_loop.py
 
 # --- Dictionary mapping month numbers to names
 month_words = {
@@ -146,124 +67,151 @@ month_words = {
 }
 
 
-# -- Get climate data function
-def climate_extraction(year, month_name, month_num):
-    # Define path where climate data for the specific year and month will be saved
-    yearly_climate = os.path.join(base_dir, f"climate_data/GRIB_climate_data/{year}/{month_name}")
-    os.makedirs(yearly_climate, exist_ok=True)
+# -- GRIB band catalogue
+# Each GRIB file holds two years of bands. Scanning every band's metadata is slow, so the
+# band times are catalogued once per GRIB file and saved next to it as JSON.
+band_catalogues = {}  # In-memory copy of the catalogues already loaded in this run
 
-    # Handle GRIB file naming based on even/odd year pattern
-    # GRIB files contain compressed climate data for two-year ranges
-    if year % 2 == 0:
-        climate_grib_path = os.path.join(base_dir, f"climate_data/GRIB_climate_data/{year}-{year + 1}.grib")
-        bc_climate_temp = os.path.join(yearly_climate, f"BC_temp_{year}-{year + 1}_{month_name}.tif")
-        bc_climate_final = os.path.join(yearly_climate, f"BC_{year}-{year + 1}_{month_name}.tif")
-    else:
-        climate_grib_path = os.path.join(base_dir, f"climate_data/GRIB_climate_data/{year - 1}-{year}.grib")
-        bc_climate_temp = os.path.join(yearly_climate, f"BC_temp_{year - 1}-{year}_{month_name}.tif")
-        bc_climate_final = os.path.join(yearly_climate, f"BC_{year - 1}-{year}_{month_name}.tif")
 
-    # Open the GRIB file using GDAL
+def build_band_catalogue(climate_grib_path):
+    """
+    Scans every band of a GRIB file and records its index, variable, raw valid time
+    and adjusted valid time (cumulative variables such as precipitation are shifted by +1 day).
+
+    Returns:
+    - dict: The catalogue, with the band indices grouped by adjusted "YYYY-MM" month.
+    """
     ds = gdal.Open(climate_grib_path)
     if ds is None:
         print("❌ Could not open GRIB file.")
-        return
+        return None
 
-    # Get total number of data bands (each band corresponds to a climate measurement at a time)
     band_count = ds.RasterCount
-    print(f"📊 Total bands: {band_count}")
-
-    # Initialize filter conditions
-    target_year = year
-    target_month = month_num
-    selected_band_indices = []
+    print(f"📊 Cataloguing {band_count} bands in {climate_grib_path}")
 
-    # Loop through all bands and extract those that match the target month/year
+    bands = []
+    months = {}
     for i in range(1, band_count + 1):
-        band = ds.GetRasterBand(i)
-        metadata = band.GetMetadata()
+        metadata = ds.GetRasterBand(i).GetMetadata()
         valid = metadata.get("GRIB_VALID_TIME")
         comment = metadata.get("GRIB_COMMENT", "").lower()
 
-        if valid:
-            valid_dt = datetime.fromtimestamp(int(valid), tz=timezone.utc)
-            adjusted_dt = valid_dt
+        if not valid:
+            print(f"⚠️ Band {i} has no VALID_TIME")
+            continue
 
-            # Adjust date if the variable is a cumulative type (e.g., total precipitation)
-            if any(keyword in comment for keyword in ["[m]", "precipitation", "total"]):
-                adjusted_dt += timedelta(days=1)
+        valid_dt = datetime.fromtimestamp(int(valid), tz=timezone.utc)
+        adjusted_dt = valid_dt
 
-            # Keep only bands from the desired month and year
-            if adjusted_dt.year == target_year and adjusted_dt.month == target_month:
-                selected_band_indices.append(i)
-                print(f"🟢 Band {i} → {adjusted_dt.strftime('%Y-%m-%d')} (adjusted from {valid_dt.strftime('%Y-%m-%d')})")
-            else:
-                print(f"⚪️ Band {i} skipped → {adjusted_dt.strftime('%Y-%m-%d')}")
-        else:
-            print(f"⚠️ Band {i} has no VALID_TIME")
+        # Adjust date if the variable is a cumulative type (e.g., total precipitation)
+        if any(keyword in comment for keyword in ["[m]", "precipitation", "total"]):
+            adjusted_dt += timedelta(days=1)
 
-    # Stop if no bands match the selected month/year
-    if not selected_band_indices:
-        print(f"⚠️ No bands selected for {month_name} {year}. Skipping...")
-        return
+        bands.append({
+            'band': i,
+            'variable': metadata.get("GRIB_ELEMENT", comment),
+            'valid_time': valid_dt.isoformat(),
+            'adjusted_time': adjusted_dt.isoformat()
+        })
+        months.setdefault(adjusted_dt.strftime('%Y-%m'), []).append(i)
+
+    ds = None  # Close the GRIB file
+    return {'band_count': band_count, 'bands': bands, 'months': months}
+
+
+def load_band_catalogue(climate_grib_path):
+    """
+    Returns the band catalogue of a GRIB file. The saved catalogue is reused as long as
+    the GRIB file size and modification time are unchanged; otherwise it is rebuilt.
+    """
+    if not os.path.exists(climate_grib_path):
+        print(f"❌ GRIB file not found: {climate_grib_path}")
+        return None
+
+    stat = os.stat(climate_grib_path)
+    catalogue_path = climate_grib_path + '.bands.json'
+
+    # Reuse the catalogue already loaded in this run, then the one saved next to the GRIB file
+    catalogue = band_catalogues.get(climate_grib_path)
+    if catalogue is None and os.path.exists(catalogue_path):
+        try:
+            with open(catalogue_path, 'r') as f:
+                catalogue = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not read band catalogue {catalogue_path}: {e}")
+
+    if catalogue is not None and catalogue.get('size') == stat.st_size and catalogue.get('mtime') == stat.st_mtime:
+        band_catalogues[climate_grib_path] = catalogue
+        return catalogue
+
+    # Missing or stale catalogue: rebuild it from the GRIB metadata and save it
+    catalogue = build_band_catalogue(climate_grib_path)
+    if catalogue is None:
+        return None
+    catalogue['size'] = stat.st_size
+    catalogue['mtime'] = stat.st_mtime
+
+    with open(catalogue_path, 'w') as f:
+        json.dump(catalogue, f, indent=2)
+    print(f"✅ Band catalogue saved to: {catalogue_path}")
+
+    band_catalogues[climate_grib_path] = catalogue
+    return catalogue
+
+
+# -- Output paths for a month
+def climate_paths(year, month_name):
+    # Define path where climate data for the specific year and month will be saved
+    yearly_climate = os.path.join(base_dir, f"climate_data/GRIB_climate_data/{year}/{month_name}")
+    os.makedirs(yearly_climate, exist_ok=True)
 
-    print(f"\n📦 Bands selected for {target_year}-{target_month:02d}: {selected_band_indices}")
+    # Handle GRIB file naming based on even/odd year pattern
+    # GRIB files contain compressed climate data for two-year ranges
+    first_year = year if year % 2 == 0 else year - 1
+    climate_grib_path = os.path.join(base_dir, f"climate_data/GRIB_climate_data/{first_year}-{first_year + 1}.grib")
+    bc_climate_final = os.path.join(yearly_climate, f"BC_{first_year}-{first_year + 1}_{month_name}.tif")
 
-    # Step 1: Extract each selected band to an in-memory temporary file
-    temp_band_files = []
-    for i, band_index in enumerate(selected_band_indices):
-        temp_path = f"/vsimem/temp_band_{i+1}.tif"
-        gdal.Translate(temp_path, climate_grib_path, bandList=[band_index])
-        temp_band_files.append(temp_path)
+    return yearly_climate, climate_grib_path, bc_climate_final
 
-    # Step 2: Combine selected bands into a virtual raster (VRT)
-    output_vrt = f"/vsimem/{month_name}_{year}.vrt"
-    gdal.BuildVRT(output_vrt, temp_band_files, separate=True)
 
-    # Step 3: Convert the virtual raster to a physical GeoTIFF file
-    output_tif = os.path.join(yearly_climate, f"{month_name}_{year}.tif")
-    gdal.Translate(output_tif, output_vrt)
+# -- Where a raw monthly stack is written before it is clipped
+def raw_stack_path(year, month_name, in_memory=True):
+    # /vsimem is only visible to GDAL in this process: worker processes and the QGIS GDAL tools need a file on disk
+    if in_memory and backend.supports_vsimem:
+        return f"/vsimem/{month_name}_{year}_{os.getpid()}.tif"
+    yearly_climate, _, _ = climate_paths(year, month_name)
+    return os.path.join(yearly_climate, f"{month_name}_{year}.tif")
 
-    # Step 4: Clip the raster to the BC boundary using QGIS
-    processing.run("gdal:cliprasterbymasklayer", {
-        'INPUT': output_tif,
-        'MASK': bc_boundary_layer_3347,  # Mask is the BC polygon boundary
-        'SOURCE_CRS': None,
-        'TARGET_CRS': None,
-        'NODATA': -9999,
-        'ALPHA_BAND': False,
-        'CROP_TO_CUTLINE': True,
-        'KEEP_RESOLUTION': True,
-        'OPTIONS': '',
-        'DATA_TYPE': 0,
-        'EXTRA': '',
-        'OUTPUT': bc_climate_temp
-    })
-
-    # Step 5: Reproject clipped raster to EPSG:3347 (Albers Equal Area projection used for Canada)
-    if os.path.exists(bc_climate_temp):
-        processing.run("gdal:warpreproject", {
-            'INPUT': bc_climate_temp,
-            'SOURCE_CRS': None,
-            'TARGET_CRS': 'EPSG:3347',
-            'RESAMPLING': 0,
-            'NODATA': None,
-            'TARGET_RESOLUTION': None,
-            'OPTIONS': '',
-            'DATA_TYPE': 0,
-            'TARGET_EXTENT': None,
-            'TARGET_EXTENT_CRS': None,
-            'MULTITHREADING': False,
-            'OUTPUT': bc_climate_final
-        })
+
+def remove_raw_stack(output_tif):
+    if output_tif.startswith('/vsimem/'):
+        gdal.Unlink(output_tif)
+    elif os.path.exists(output_tif):
+        os.remove(output_tif)
+
+
+# -- Clip, reproject and fill a monthly climate stack
+def process_climate_stack(year, month_name, output_tif):
+    yearly_climate, _, bc_climate_final = climate_paths(year, month_name)
+
+    # Steps 4 and 5: Clip to the BC boundary and reproject to EPSG:3347 (Albers Equal Area projection used for Canada) in one warp
+    # ERA5 is a coarse regular lat/lon grid, so by default it is only cropped and the points are sampled by lat/lon instead
+    if not reproject_climate:
+        if backend.clip_raster_by_mask(output_tif, reprojected_bc_boundary, bc_climate_final) is not None:
+            print("✅ Clipped raster to BC on its native lat/lon grid.")
+            climate_loaded = backend.load_raster(bc_climate_final, f"BC Climate raster {month_name} {year}")
+        else:
+            print("❌ Failed to clip raster to BC.")
+            return
+    elif backend.clip_raster_by_mask(output_tif, reprojected_bc_boundary, bc_climate_final, target_crs='EPSG:3347') is not None:
         print("✅ Reprojected raster to EPSG:3347 successfully.")
-        bc_climate_raster_epsg3347 = QgsRasterLayer(bc_climate_final, f"BC Climate raster {month_name} {year} (EPSG:3347)")
+        climate_loaded = backend.load_raster(bc_climate_final, f"BC Climate raster {month_name} {year} (EPSG:3347)")
     else:
         print("❌ Failed to reproject raster to EPSG:3347.")
         return
 
-    # Step 6: Load the reprojected climate raster into QGIS
-    if bc_climate_raster_epsg3347.isValid():
+    # Step 6: Load the reprojected climate raster
+    if climate_loaded:
         print("✅ Loaded reprojected climate raster successfully.")
     else:
         print("❌ Failed to load reprojected raster.") 
@@ -273,67 +221,261 @@ def climate_extraction(year, month_name, month_num):
     bc_climate_filled = os.path.join(output_folder, 'Filled_Stacked_Climate.tif')
     os.makedirs(output_folder, exist_ok=True)
 
-    # === Step 7: Fill in NoData (missing pixel) values for each band ===
-    ds_final = gdal.Open(bc_climate_final)
-    if ds_final is None:
+    # === Steps 7 and 8: Fill in NoData (missing pixel) values for all bands and write the filled stack ===
+    print("🌀 Filling NoData for all bands...")
+    if backend.fill_nodata(bc_climate_final, bc_climate_filled, max_distance=10) is None:
         print(f"❌ Failed to open reprojected raster {bc_climate_final}")
         return
 
-    band_count = ds_final.RasterCount
-    print(f"📊 Found {band_count} bands to fill.")
-
-    filled_band_paths = []
-
-    for i in range(1, band_count + 1):
-        output_band = os.path.join(output_folder, f'filled_band_{i}.tif')
-        print(f"🌀 Filling NoData for Band {i}...")
-
-        processing.run("gdal:fillnodata", {
-            'INPUT': bc_climate_final,
-            'BAND': i,
-            'MASK_LAYER': None,
-            'DISTANCE': 10,
-            'ITERATIONS': 0,
-            'NO_MASK': False,
-            'OUTPUT': output_band
-        })
-
-        if os.path.exists(output_band):
-            print(f"✅ Band {i} filled and saved to {output_band}")
-            filled_band_paths.append(output_band)
-        else:
-            print(f"❌ Failed to process Band {i}")
-
-    # === Step 8: Stack filled bands into one multi-band raster file ===
-    print("🧱 Stacking filled bands into one raster...")
-    vrt_path = os.path.join(output_folder, 'temp_stack.vrt')
-    gdal.BuildVRT(vrt_path, filled_band_paths, separate=True)
-    gdal.Translate(bc_climate_filled, vrt_path)
-
     print(f"🎉 All bands filled and stacked! Final output: {bc_climate_filled}")
 
-    # Load final stacked raster into QGIS
+    # Load final stacked raster
     layer_name = f"Filled BC Climate {month_name} {year}"
-    bc_climate_layer = QgsRasterLayer(bc_climate_filled, layer_name)
-    if bc_climate_layer.isValid():
+    if backend.load_raster(bc_climate_filled, layer_name):
         print(f"✅ Reprojected climate raster '{layer_name}' created successfully.")
     else:
         print("❌ Failed to load reprojected raster.")
 
-    # === Cleanup temporary in-memory files ===
+    return bc_climate_filled
+
+
+# -- Get climate data function
+def climate_extraction(year, month_name, month_num):
+    yearly_climate, climate_grib_path, _ = climate_paths(year, month_name)
+
+    # Look up the bands for the target month/year in the GRIB band catalogue
+    catalogue = load_band_catalogue(climate_grib_path)
+    if catalogue is None:
+        return
+
+    target_year = year
+    target_month = month_num
+    selected_band_indices = catalogue['months'].get(f"{target_year}-{target_month:02d}", [])
+
+    # Stop if no bands match the selected month/year
+    if not selected_band_indices:
+        print(f"⚠️ No bands selected for {month_name} {year}. Skipping...")
+        return
+
+    print(f"\n📦 Bands selected for {target_year}-{target_month:02d}: {selected_band_indices}")
+
+    # Step 1: Extract each selected band to an in-memory temporary file
+    # The /vsimem names carry the month, year and process id so parallel jobs never collide
+    job_tag = f"{month_name}_{year}_{os.getpid()}"
+    temp_band_files = []
+    for i, band_index in enumerate(selected_band_indices):
+        temp_path = f"/vsimem/{job_tag}_temp_band_{i+1}.tif"
+        gdal.Translate(temp_path, climate_grib_path, bandList=[band_index])
+        temp_band_files.append(temp_path)
+
+    # Step 2: Combine selected bands into a virtual raster (VRT)
+    output_vrt = f"/vsimem/{job_tag}.vrt"
+    gdal.BuildVRT(output_vrt, temp_band_files, separate=True)
+
+    # Step 3: Convert the virtual raster to a GeoTIFF stack (in memory unless the backend cannot read /vsimem)
+    output_tif = raw_stack_path(year, month_name)
+    gdal.Translate(output_tif, output_vrt)
+
+    # Steps 4 to 8: Clip, reproject, fill and stack
+    bc_climate_filled = process_climate_stack(year, month_name, output_tif)
+
+    # === Cleanup temporary files ===
+    remove_raw_stack(output_tif)
     gdal.Unlink(output_vrt)
     for path in temp_band_files:
         gdal.Unlink(path)
 
     return bc_climate_filled
-    
 
-for year in range(start_year, end_year + 1):
-    # Loop through each year in the specified range (e.g., from 2000 to 2024)
-    print(f"Processing {year}...")
 
-    # Loop through each month of the year using the month_words dictionary
-    for month_num, month_name in month_words.items():
-        # For the current month and year, extract and process climate data
-        # This function finds the correct GRIB bands, clips to BC, reprojects, fills nodata, and stacks them
-        bc_climate_filled = climate_extraction(year, month_name, month_num)
+# -- Extract every month of a two-year GRIB file from a single decode
+def climate_extraction_grib(first_year, process_stacks=True, failures=None):
+    """
+    Opens the {first_year}-{first_year + 1} GRIB file once, reads all of its bands into memory
+    in one pass, groups them by adjusted month and writes every monthly stack from that decode.
+
+    Parameters:
+    - first_year (int): First (even) year covered by the GRIB file.
+    - process_stacks (bool): Clip, reproject and fill each monthly stack right away. When False,
+      the raw monthly stacks are only written so they can be processed by worker processes.
+    - failures (dict): If given, the reason each month between start_year and end_year was skipped
+      is recorded in it under (year, month_name).
+
+    Returns:
+    - dict: Filled (or raw, if process_stacks is False) climate stack path for each (year, month_name).
+    """
+    _, climate_grib_path, _ = climate_paths(first_year, month_words[1])
+    if failures is None:
+        failures = {}
+
+    # Months of this GRIB file that fall in the processed years
+    expected_months = [(year, month_name) for year in (first_year, first_year + 1) if start_year <= year <= end_year
+                       for month_name in month_words.values()]
+
+    catalogue = load_band_catalogue(climate_grib_path)
+    if catalogue is None:
+        failures.update({month: "GRIB file missing or unreadable" for month in expected_months})
+        return {}
+
+    # Open the GRIB file and decode every band once
+    ds = gdal.Open(climate_grib_path)
+    if ds is None:
+        print("❌ Could not open GRIB file.")
+        failures.update({month: "GRIB file could not be opened" for month in expected_months})
+        return {}
+
+    print(f"📖 Reading all {ds.RasterCount} bands of {climate_grib_path}...")
+    all_bands = ds.ReadAsArray()
+    if all_bands.ndim == 2:  # A single-band GRIB is returned as (y, x)
+        all_bands = all_bands[np.newaxis, :, :]
+
+    geotransform = ds.GetGeoTransform()
+    projection = ds.GetProjection()
+    data_type = ds.GetRasterBand(1).DataType
+    nodata = ds.GetRasterBand(1).GetNoDataValue()
+    ds = None  # Close the GRIB file
+
+    filled_paths = {}
+
+    for year in (first_year, first_year + 1):
+        if year < start_year or year > end_year:
+            continue
+
+        for month_num, month_name in month_words.items():
+            selected_band_indices = catalogue['months'].get(f"{year}-{month_num:02d}", [])
+            if not selected_band_indices:
+                print(f"⚠️ No bands selected for {month_name} {year}. Skipping...")
+                failures[(year, month_name)] = "no bands for month"
+                continue
+
+            print(f"\n📦 Bands selected for {year}-{month_num:02d}: {selected_band_indices}")
+
+            # Write the month's bands straight from the decoded array
+            # Worker processes cannot see our /vsimem, so stacks handed to them are written to disk
+            output_tif = raw_stack_path(year, month_name, in_memory=process_stacks)
+            month_stack = all_bands[[i - 1 for i in selected_band_indices]]
+            write_stack(output_tif, month_stack, geotransform, projection, data_type, nodata)
+
+            if not process_stacks:
+                filled_paths[(year, month_name)] = output_tif
+                continue
+
+            bc_climate_filled = process_climate_stack(year, month_name, output_tif)
+            remove_raw_stack(output_tif)
+            if bc_climate_filled:
+                filled_paths[(year, month_name)] = bc_climate_filled
+
+    return filled_paths
+
+
+# === Parallel climate extraction ===
+def init_worker(bc_boundary_path, backend_name, warp_threads):
+    # Each worker process sets up its own backend (a headless GDAL backend starts without QGIS)
+    global reprojected_bc_boundary
+    init_processing(backend_name)
+    Geo_backend.warp_threads = warp_threads  # The workers share the CPUs, so each warp gets only its share of threads
+
+    reprojected_bc_boundary = bc_boundary_path
+    if not os.path.exists(reprojected_bc_boundary):
+        print(f"❌ Worker {os.getpid()} cannot find the reprojected BC boundary: {reprojected_bc_boundary}")
+
+
+def run_climate_job(year, month_name, output_tif):
+    # Clip, reproject and fill one month inside a worker process and report back what happened
+    # The raw stack was only written for this job, so it is removed whatever the outcome
+    try:
+        bc_climate_filled = process_climate_stack(year, month_name, output_tif)
+    except Exception as e:
+        return year, month_name, None, str(e)
+    finally:
+        remove_raw_stack(output_tif)
+    if not bc_climate_filled:
+        return year, month_name, None, "no filled stack produced"
+    return year, month_name, bc_climate_filled, None
+
+
+def run_parallel_climate_extraction(workers):
+    """
+    Decodes each GRIB file once in the main process, then spreads the (year, month) clip,
+    reproject and fill jobs over a pool of worker processes.
+
+    Returns:
+    - dict: Filled climate stack path for each (year, month_name) that succeeded.
+    """
+    filled_paths = {}
+    failures = {}
+    summary = {month_name: {'succeeded': 0, 'failed': 0} for month_name in month_words.values()}
+
+    # 'spawn' gives every worker a clean GDAL/QGIS state instead of a forked copy of ours
+    # Without a thread limit every worker's warp would start ALL_CPUS threads (workers × CPUs in total)
+    warp_threads = max(1, (os.cpu_count() or 1) // workers)
+    mp_context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context,
+                             initializer=init_worker, initargs=(reprojected_bc_boundary, backend.name, warp_threads)) as executor:
+        futures = {}
+        for first_year in range(start_year - start_year % 2, end_year + 1, 2):
+            print(f"Decoding {first_year}-{first_year + 1}...")
+            skipped = {}  # Months of the GRIB file that never become a job
+            raw_stacks = climate_extraction_grib(first_year, process_stacks=False, failures=skipped)
+            for (year, month_name), reason in skipped.items():
+                failures[(year, month_name)] = reason
+                summary[month_name]['failed'] += 1
+            for (year, month_name), output_tif in raw_stacks.items():
+                try:
+                    futures[executor.submit(run_climate_job, year, month_name, output_tif)] = (year, month_name, output_tif)
+                except BrokenProcessPool:
+                    # A worker died (e.g. out of memory) and the pool accepts no more jobs
+                    print(f"❌ Worker pool stopped, {month_name} {year} not submitted.")
+                    failures[(year, month_name)] = "worker pool stopped"
+                    summary[month_name]['failed'] += 1
+                    remove_raw_stack(output_tif)
+
+        for future in as_completed(futures):
+            try:
+                year, month_name, bc_climate_filled, error = future.result()
+            except BrokenProcessPool:
+                # The job's worker died before it could report back (every job left in the pool fails the same way)
+                year, month_name, output_tif = futures[future]
+                bc_climate_filled, error = None, "worker process terminated abruptly"
+                remove_raw_stack(output_tif)
+            if error is None:
+                filled_paths[(year, month_name)] = bc_climate_filled
+                summary[month_name]['succeeded'] += 1
+            else:
+                failures[(year, month_name)] = error
+                summary[month_name]['failed'] += 1
+
+    # Summary of successes and failures per month
+    print("\n📋 Climate extraction summary:")
+    for month_name, counts in summary.items():
+        print(f"   {month_name:<10} ✅ {counts['succeeded']:>3}   ❌ {counts['failed']:>3}")
+    for (year, month_name), error in sorted(failures.items()):
+        print(f"❌ {month_name} {year} failed: {error}")
+
+    return filled_paths
+
+
+if __name__ == "__main__":
+    init_processing()
+    preprocessed = prepare_inputs()
+    if preprocessed is None:
+        sys.exit(1)
+    reprojected_bc_boundary = preprocessed['bc_boundary_3347']
+
+    if climate_workers > 1:
+        filled_paths = run_parallel_climate_extraction(climate_workers)
+    else:
+        filled_paths = {}
+        # Each GRIB file covers two years, so it is opened and decoded once for all 24 of its months
+        for first_year in range(start_year - start_year % 2, end_year + 1, 2):
+            print(f"Processing {first_year}-{first_year + 1}...")
+
+            # This finds every month's GRIB bands, clips to BC, reprojects, fills nodata, and stacks them
+            filled_paths.update(climate_extraction_grib(first_year))
+
+    # Combine every month into one datacube so readers don't have to open hundreds of stacks
+    month_nums = {month_name: month_num for month_num, month_name in month_words.items()}
+    build_climate_datacube(
+        {(year, month_nums[month_name]): path for (year, month_name), path in filled_paths.items()},
+        climate_cube_dir
+    )
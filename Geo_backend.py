@@ -0,0 +1,386 @@
+# Geoprocessing backends for the pipeline scripts
+# The GDAL backend uses only GDAL/OGR/NumPy and starts instantly; the QGIS backend runs the same
+# operations through the QGIS processing toolbox and is only imported when it is selected.
+import os
+import numpy as np  # Array handling for raster stacks
+from scipy import ndimage  # Nearest-valid-pixel search for the NoData fill
+from osgeo import gdal, ogr, osr  # GDAL: Geospatial Data Abstraction Library
+
+
+# === Warp settings (used by every warp of both backends) ===
+warp_multithread = True      # Use multithreaded warping (worker threads for computation and I/O)
+warp_threads = 'ALL_CPUS'    # Number of warp threads when multithreading (an integer or 'ALL_CPUS')
+warp_memory_limit_mb = 512   # Working memory available to each warp, in MB
+
+
+def gdal_warp_options(**options):
+    # gdal.WarpOptions with the shared multithreading and memory settings
+    return gdal.WarpOptions(
+        multithread=warp_multithread,
+        warpMemoryLimit=warp_memory_limit_mb,
+        warpOptions=[f'NUM_THREADS={warp_threads}'] if warp_multithread else None,
+        **options
+    )
+
+
+def gdalwarp_extra():
+    # The same settings as gdalwarp command-line options, for the QGIS GDAL algorithms
+    extra = f'-wm {warp_memory_limit_mb}'
+    if warp_multithread:
+        extra += f' -multi -wo NUM_THREADS={warp_threads}'
+    return extra
+
+
+# -- Write a (bands, y, x) array to a GeoTIFF
+def write_stack(output_raster, stack, geotransform, projection, data_type, nodata=None):
+    driver = gdal.GetDriverByName('GTiff')
+    out_ds = driver.Create(output_raster, stack.shape[2], stack.shape[1], stack.shape[0], data_type)
+    out_ds.SetGeoTransform(geotransform)
+    out_ds.SetProjection(projection)
+    for b in range(stack.shape[0]):
+        out_band = out_ds.GetRasterBand(b + 1)
+        if nodata is not None:
+            out_band.SetNoDataValue(nodata)
+        out_band.WriteArray(stack[b])
+    out_ds = None  # Flush to disk
+
+
+# -- Fill NoData pixels in every band at once
+def fill_nodata_stack(input_raster, output_raster, max_distance=10):
+    """
+    Fills NoData pixels in every band of a raster stack with the value of the nearest valid pixel
+    up to max_distance pixels away. All bands share the same NoData mask, so the nearest-pixel
+    indices are computed once and applied to the whole (bands, y, x) array in a single gather.
+
+    Returns:
+    - bool: True if the filled stack was written.
+    """
+    ds = gdal.Open(input_raster)
+    if ds is None:
+        return False
+
+    stack = ds.ReadAsArray()
+    if stack.ndim == 2:  # A single-band raster is returned as (y, x)
+        stack = stack[np.newaxis, :, :]
+    geotransform = ds.GetGeoTransform()
+    projection = ds.GetProjection()
+    data_type = ds.GetRasterBand(1).DataType
+    nodata = ds.GetRasterBand(1).GetNoDataValue()
+    ds = None
+
+    # NoData (or NaN) pixels per band, and the shared mask of pixels missing in any band
+    band_missing = np.zeros(stack.shape, dtype=bool)
+    if nodata is not None:
+        band_missing |= stack == nodata
+    if np.issubdtype(stack.dtype, np.floating):
+        band_missing |= np.isnan(stack)
+    missing = band_missing.any(axis=0)
+
+    if missing.any() and not missing.all():
+        # For every pixel, the distance to and the row/column of the nearest pixel valid in all bands
+        distance, (rows, cols) = ndimage.distance_transform_edt(missing, return_indices=True)
+        to_fill = missing & (distance <= max_distance)
+
+        # Gather the nearest valid values for all bands at once; values that were already valid are kept
+        nearest = stack[:, rows[to_fill], cols[to_fill]]
+        stack[:, to_fill] = np.where(band_missing[:, to_fill], nearest, stack[:, to_fill])
+        print(f"✅ Filled {int(to_fill.sum())} of {int(missing.sum())} NoData pixels in {stack.shape[0]} bands")
+
+    write_stack(output_raster, stack, geotransform, projection, data_type, nodata)
+    return True
+
+
+# -- Read a raster into memory and sample it at points
+def read_raster_array(raster_path):
+    """
+    Reads every band of a raster into memory with its grid.
+
+    Returns:
+    - dict: 'data' (bands, y, x) array, 'geotransform', 'nodata' and 'geographic'. None if the raster cannot be opened.
+    """
+    ds = gdal.Open(raster_path)
+    if ds is None:
+        return None
+    data = ds.ReadAsArray()
+    if data.ndim == 2:  # A single-band raster is returned as (y, x)
+        data = data[np.newaxis, :, :]
+    raster = {
+        'data': data,
+        'geotransform': ds.GetGeoTransform(),
+        'nodata': ds.GetRasterBand(1).GetNoDataValue(),
+        'geographic': bool(osr.SpatialReference(wkt=ds.GetProjection()).IsGeographic())
+    }
+    ds = None
+    return raster
+
+
+def sample_raster_array(raster, xs, ys):
+    """
+    Samples an in-memory raster at points given in the raster's CRS. Pixel indices come from
+    the raster's affine geotransform, so all points are looked up with one fancy-indexing read.
+
+    Returns:
+    - np.ndarray: (points, bands) float64 values, NaN for points outside the raster or on NoData cells.
+    """
+    data = raster['data']
+    x0, dx, _, y0, _, dy = raster['geotransform']
+    n_bands, n_rows, n_cols = data.shape
+
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    cols = np.floor((xs - x0) / dx).astype(np.int64)
+    rows = np.floor((ys - y0) / dy).astype(np.int64)
+    inside = (cols >= 0) & (cols < n_cols) & (rows >= 0) & (rows < n_rows)
+
+    values = np.full((xs.size, n_bands), np.nan)
+    values[inside] = data[:, rows[inside], cols[inside]].T
+    if raster['nodata'] is not None:
+        values[values == raster['nodata']] = np.nan
+    return values
+
+
+# === Pure GDAL/OGR backend ===
+class GdalBackend:
+    """
+    Runs the pipeline's geoprocessing operations with GDAL/OGR and NumPy only.
+    Inputs and outputs are file paths; every operation returns its output path, or None on failure.
+    """
+    name = 'gdal'
+    supports_vsimem = True  # Operations run in this process, so they can read and write /vsimem files
+
+    # -- Vector operations
+    def extract_by_attribute(self, input_path, field, value, output_path):
+        # Keeps the features whose field equals value (like native:extractbyattribute with OPERATOR 0)
+        where = "{} = '{}'".format(field, str(value).replace("'", "''"))
+        out_ds = gdal.VectorTranslate(output_path, input_path, where=where)
+        if out_ds is None:
+            return None
+        out_ds = None  # Flush to disk
+        return output_path
+
+    def reproject_layer(self, input_path, target_crs, output_path):
+        out_ds = gdal.VectorTranslate(output_path, input_path, dstSRS=target_crs, reproject=True)
+        if out_ds is None:
+            return None
+        out_ds = None
+        return output_path
+
+    # -- Raster operations
+    def clip_raster_by_mask(self, input_raster, mask_path, output_raster, nodata=-9999, target_crs=None):
+        # Crops to the mask polygons and sets nodata outside them in one warp; with target_crs it also
+        # reprojects (nearest neighbour), otherwise the raster keeps its own grid
+        warp_options = gdal_warp_options(
+            format='GTiff', cutlineDSName=mask_path, cropToCutline=True, dstSRS=target_crs,
+            resampleAlg='near', dstNodata=nodata
+        )
+        out_ds = gdal.Warp(output_raster, input_raster, options=warp_options)
+        if out_ds is None:
+            return None
+        out_ds = None  # Flush to disk
+        return output_raster
+
+    def warp_reproject(self, input_raster, output_raster, target_crs, nodata=None, resampling='near', creation_options=None):
+        warp_options = gdal_warp_options(
+            format='GTiff', dstSRS=target_crs, resampleAlg=resampling, dstNodata=nodata,
+            creationOptions=creation_options
+        )
+        out_ds = gdal.Warp(output_raster, input_raster, options=warp_options)
+        if out_ds is None:
+            return None
+        out_ds = None
+        return output_raster
+
+    def fill_nodata(self, input_raster, output_raster, max_distance=10):
+        return output_raster if fill_nodata_stack(input_raster, output_raster, max_distance) else None
+
+    def raster_sampling(self, raster_path, xs, ys):
+        """
+        Samples every band of a raster at points given in the raster's CRS.
+
+        Returns:
+        - np.ndarray: (points, bands) float64 values, NaN outside the raster or on NoData cells. None if it cannot be read.
+        """
+        raster = read_raster_array(raster_path)
+        return None if raster is None else sample_raster_array(raster, xs, ys)
+
+    # -- Loading outputs (there is no map project without QGIS, so this only checks them)
+    def load_raster(self, path, name, add_to_project=False):
+        return gdal.Open(path) is not None
+
+    def load_vector(self, path, name, add_to_project=False):
+        return ogr.Open(path) is not None
+
+
+# === QGIS processing backend ===
+class QgisBackend:
+    """
+    Runs the same operations through the QGIS processing toolbox. QGIS is imported and initialised
+    only when this backend is created, so the GDAL backend never pays its start-up cost.
+    Vector inputs can be file paths or QgsVectorLayer objects.
+    """
+    name = 'qgis'
+    supports_vsimem = False  # The GDAL algorithms run gdal command-line tools, which cannot see this process's /vsimem
+
+    def __init__(self):
+        global processing, QgsApplication, QgsProject, QgsRasterLayer, QgsVectorLayer, QgsCoordinateReferenceSystem, QgsPointXY
+        import processing  # QGIS processing framework
+        from processing.core.Processing import Processing
+        from processing.algs.gdal.GdalAlgorithmProvider import GdalAlgorithmProvider
+        from qgis.analysis import QgsNativeAlgorithms  # QGIS built-in tools
+        from qgis.core import (
+            QgsApplication, QgsProject, QgsRasterLayer, QgsVectorLayer, QgsCoordinateReferenceSystem, QgsPointXY
+        )
+
+        # Outside the QGIS desktop (e.g. in a worker process) a headless QGIS application is needed first
+        self.qgs_app = None
+        if QgsApplication.instance() is None:
+            self.qgs_app = QgsApplication([], False)
+            self.qgs_app.initQgis()
+
+        Processing.initialize()
+
+        # Add QGIS built-in tools and GDAL tools to the processing framework
+        QgsApplication.processingRegistry().addProvider(QgsNativeAlgorithms())
+        QgsApplication.processingRegistry().addProvider(GdalAlgorithmProvider())
+
+    # -- Vector operations
+    def extract_by_attribute(self, input_path, field, value, output_path):
+        result = processing.run("native:extractbyattribute", {
+            'INPUT': input_path,
+            'FIELD': field,
+            'OPERATOR': 0,  # 0 = equals
+            'VALUE': value,
+            'OUTPUT': output_path
+        })
+        return result['OUTPUT']
+
+    def reproject_layer(self, input_path, target_crs, output_path):
+        result = processing.run("native:reprojectlayer", {
+            'INPUT': input_path,
+            'TARGET_CRS': QgsCoordinateReferenceSystem(target_crs),
+            'OUTPUT': output_path
+        })
+        return result['OUTPUT']
+
+    # -- Raster operations
+    def clip_raster_by_mask(self, input_raster, mask_path, output_raster, nodata=-9999, target_crs=None):
+        result = processing.run("gdal:cliprasterbymasklayer", {
+            'INPUT': input_raster,
+            'MASK': mask_path,
+            'SOURCE_CRS': None,
+            'TARGET_CRS': QgsCoordinateReferenceSystem(target_crs) if target_crs else None,
+            'NODATA': nodata,
+            'ALPHA_BAND': False,
+            'CROP_TO_CUTLINE': True,
+            'KEEP_RESOLUTION': target_crs is None,
+            'OPTIONS': '',
+            'DATA_TYPE': 0,
+            'MULTITHREADING': warp_multithread,
+            'EXTRA': gdalwarp_extra(),
+            'OUTPUT': output_raster
+        })
+        return result['OUTPUT']
+
+    def warp_reproject(self, input_raster, output_raster, target_crs, nodata=None, resampling='near', creation_options=None):
+        result = processing.run("gdal:warpreproject", {
+            'INPUT': input_raster,
+            'SOURCE_CRS': None,
+            'TARGET_CRS': QgsCoordinateReferenceSystem(target_crs),
+            'RESAMPLING': RESAMPLING_CODES[resampling],
+            'NODATA': nodata,
+            'TARGET_RESOLUTION': None,
+            'OPTIONS': '|'.join(creation_options or []),
+            'DATA_TYPE': 0,
+            'TARGET_EXTENT': None,
+            'TARGET_EXTENT_CRS': None,
+            'MULTITHREADING': warp_multithread,
+            'EXTRA': gdalwarp_extra(),
+            'OUTPUT': output_raster
+        })
+        return result['OUTPUT']
+
+    def fill_nodata(self, input_raster, output_raster, max_distance=10):
+        # gdal:fillnodata works one band at a time, so each band is filled and the results are stacked
+        ds = gdal.Open(input_raster)
+        if ds is None:
+            return None
+        band_count = ds.RasterCount
+        ds = None
+
+        output_folder = os.path.dirname(output_raster)
+        filled_band_paths = []
+        for i in range(1, band_count + 1):
+            output_band = os.path.join(output_folder, f'filled_band_{i}.tif')
+            processing.run("gdal:fillnodata", {
+                'INPUT': input_raster,
+                'BAND': i,
+                'MASK_LAYER': None,
+                'DISTANCE': max_distance,
+                'ITERATIONS': 0,
+                'NO_MASK': False,
+                'OUTPUT': output_band
+            })
+            if os.path.exists(output_band):
+                filled_band_paths.append(output_band)
+
+        vrt_path = os.path.join(output_folder, 'temp_stack.vrt')
+        vrt_ds = gdal.BuildVRT(vrt_path, filled_band_paths, separate=True)
+        vrt_ds = None
+        out_ds = gdal.Translate(output_raster, vrt_path)
+        out_ds = None
+
+        # The single-band files are only needed to build the stack
+        gdal.GetDriverByName('VRT').Delete(vrt_path)
+        for path in filled_band_paths:
+            gdal.GetDriverByName('GTiff').Delete(path)
+        return output_raster if os.path.exists(output_raster) else None
+
+    def raster_sampling(self, raster_path, xs, ys):
+        # Samples every band through the raster data provider, one point at a time (like native:rastersampling)
+        layer = QgsRasterLayer(raster_path, 'sampling')
+        if not layer.isValid():
+            return None
+        provider = layer.dataProvider()
+        n_bands = layer.bandCount()
+        values = np.full((len(xs), n_bands), np.nan)
+        for i, (x, y) in enumerate(zip(np.asarray(xs, dtype=np.float64).tolist(), np.asarray(ys, dtype=np.float64).tolist())):
+            point = QgsPointXY(x, y)
+            for b in range(n_bands):
+                value, ok = provider.sample(point, b + 1)
+                if ok:
+                    values[i, b] = value
+        return values
+
+    # -- Loading outputs into the QGIS project
+    def load_raster(self, path, name, add_to_project=False):
+        layer = QgsRasterLayer(path, name)
+        if layer.isValid() and add_to_project:
+            QgsProject.instance().addMapLayer(layer)
+        return layer.isValid()
+
+    def load_vector(self, path, name, add_to_project=False):
+        layer = QgsVectorLayer(path, name, 'ogr')
+        if layer.isValid() and add_to_project:
+            QgsProject.instance().addMapLayer(layer)
+        return layer.isValid()
+
+
+RESAMPLING_CODES = {'near': 0, 'bilinear': 1, 'cubic': 2}  # gdal:warpreproject RESAMPLING values
+
+backends = {}  # One backend instance per process and name
+
+
+def get_backend(name=None):
+    """
+    Returns the geoprocessing backend: 'gdal' (default) or 'qgis'.
+    The name can also be set with the BC_WILDFIRE_BACKEND environment variable.
+    """
+    name = name or os.environ.get('BC_WILDFIRE_BACKEND', 'gdal')
+    if name not in backends:
+        if name == 'gdal':
+            backends[name] = GdalBackend()
+        elif name == 'qgis':
+            backends[name] = QgisBackend()
+        else:
+            raise ValueError(f"Unknown geoprocessing backend: {name}")
+    return backends[name]
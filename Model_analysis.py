@@ -50,24 +50,40 @@ from xgboost import XGBClassifier
 # More metrics to evaluate predictions (e.g., confusion matrix, accuracy, precision, recall)
 from sklearn.metrics import confusion_matrix, accuracy_score, precision_score, recall_score
 
+# Reading the point pipeline's Parquet dataset (typed Year/Month partitions and categorical Fuel_Type)
+from Point_table import read_point_dataset
+
 
 """### load data"""
 
 base_dir = "C:/Users/tdoa2/Downloads/Spatial data analysis"
 
 # Load data
-df_list = []
-for year in range(2000, 2025):
-  if year % 2 == 0 and year != 2024:
-    df_temp = pd.read_csv(os.path.join(base_dir, f"Spatial data cleaning/Point_data/Sampled/Combined_Sampled_Points_{year}-{year+1}.csv"))
-    df_list.append(df_temp)
-  elif year == 2024:
-    df_temp = pd.read_csv(os.path.join(base_dir, f"Spatial data cleaning/Point_data/Sampled/Combined_Sampled_Points_{year}.csv"))
-    df_list.append(df_temp)
-  else:
-      continue
-
-df = pd.concat(df_list, ignore_index=True)
+# The point pipeline writes one Parquet dataset partitioned by Year/Month with typed columns
+# (float32 climate values, categorical Fuel_Type, Month as a number); older runs wrote combined CSVs instead
+points_dataset = os.path.join(base_dir, "Spatial data cleaning/Point_data/Sampled/Sampled_Points.parquet")
+if os.path.exists(points_dataset):
+  df = read_point_dataset(points_dataset)
+else:
+  df_list = []
+  for year in range(2000, 2025):
+    if year % 2 == 0 and year != 2024:
+      df_temp = pd.read_csv(os.path.join(base_dir, f"Spatial data cleaning/Point_data/Sampled/Combined_Sampled_Points_{year}-{year+1}.csv"))
+      df_list.append(df_temp)
+    elif year == 2024:
+      df_temp = pd.read_csv(os.path.join(base_dir, f"Spatial data cleaning/Point_data/Sampled/Combined_Sampled_Points_{year}.csv"))
+      df_list.append(df_temp)
+    else:
+        continue
+
+  df = pd.concat(df_list, ignore_index=True)
+
+  # Match the Parquet dataset: month numbers instead of names, and the untruncated column names
+  month_numbers = {'January': 1, 'February': 2, 'March': 3, 'April': 4, 'May': 5, 'June': 6, 'July': 7,
+                   'August': 8, 'September': 9, 'October': 10, 'November': 11, 'December': 12}
+  df['Month'] = df['Month'].map(month_numbers).astype('int8')
+  df['Year'] = df['Year'].astype('int16')
+  df = df.rename(columns={'dew_temp_2': 'dew_temp_2m'})
 
 # Drop missing values
 initial_rows = len(df)
@@ -305,7 +321,7 @@ cm_df.to_csv(os.path.join(base_dir, "Model Analysis/Tables/Random_Forest_Confusi
 
 # Filtered August 2024 table for confusion matrix
 
-filtered_df = df[(df['Month'] == 'August') & (df['Year'] == 2024)]
+filtered_df = df[(df['Month'] == 8) & (df['Year'] == 2024)]
 filtered_X = filtered_df.drop(['Fire', 'X', 'Y', 'Month', 'Year', 'Latitude', 'Longitude', 'u10_wind', 'v10_wind'], axis=1)
 filtered_y = filtered_df['Fire']
 print(filtered_df)
@@ -404,7 +420,7 @@ df_effect = plot_variable_effect(
 )
 
 # Dewpoint temperature
-feature_index = list(X_train.columns).index('dew_temp_2')
+feature_index = list(X_train.columns).index('dew_temp_2m')
 print(feature_index)
 csv_path = os.path.join(base_dir, "Model Analysis/Graphs/RF_dewpoint_temp_avg_probabilities.csv")
 
@@ -0,0 +1,188 @@
+# Columnar point table passed between the stages of the point pipeline
+# A table is a dict of equal-length NumPy columns: 'x' and 'y' (EPSG:3347) plus the point attributes.
+# Filters and merges are array masks and concatenations, so no stage copies points one by one.
+import os
+import csv
+import json
+import numpy as np
+from osgeo import ogr, osr  # Writing tables as vector files
+
+try:
+    import pyarrow as pa  # Optional: Parquet output
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
+
+# Columns every table starts with, in output order ('x'/'y' are written as the CSV's X/Y columns)
+POINT_COLUMNS = ['x', 'y', 'Latitude', 'Longitude', 'Month', 'Year', 'Fire']
+
+
+# -- Build a table
+def make_point_table(xs, ys, lats, lons, month_name, year, fire):
+    """
+    Builds a table for points that all belong to one month and share one Fire label.
+
+    Returns:
+    - dict: Typed columns: float64 coordinates, str Month, int32 Year and Fire.
+    """
+    n_points = len(xs)
+    return {
+        'x': np.asarray(xs, dtype=np.float64),
+        'y': np.asarray(ys, dtype=np.float64),
+        'Latitude': np.asarray(lats, dtype=np.float64),
+        'Longitude': np.asarray(lons, dtype=np.float64),
+        'Month': np.full(n_points, month_name),
+        'Year': np.full(n_points, year, dtype=np.int32),
+        'Fire': np.full(n_points, fire, dtype=np.int32)
+    }
+
+
+def point_table_length(table):
+    return 0 if table is None else len(table['x'])
+
+
+# -- Merge and filter tables
+def concat_point_tables(*tables):
+    # Stacks tables with the same columns (None tables are skipped), keeping their order
+    tables = [table for table in tables if table is not None]
+    if not tables:
+        return None
+    return {name: np.concatenate([table[name] for table in tables]) for name in tables[0]}
+
+
+def filter_point_table(table, keep):
+    # Keeps the rows where keep is True (or the rows at the given indices)
+    return {name: column[keep] for name, column in table.items()}
+
+
+# -- Write tables to disk
+def ogr_field_type(column):
+    if np.issubdtype(column.dtype, np.integer):
+        return ogr.OFTInteger
+    if np.issubdtype(column.dtype, np.floating):
+        return ogr.OFTReal
+    return ogr.OFTString
+
+
+def write_point_table(table, output_path, driver_name='ESRI Shapefile', epsg=3347):
+    """
+    Writes a table as a point vector file with OGR. Column order is kept; the geometry comes from 'x'/'y'.
+
+    Returns:
+    - bool: True if the file was written.
+    """
+    driver = ogr.GetDriverByName(driver_name)
+    if driver is None:
+        return False
+    out_ds = driver.CreateDataSource(output_path)
+    if out_ds is None:
+        return False
+
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(epsg)
+    layer = out_ds.CreateLayer('points', srs=srs, geom_type=ogr.wkbPoint)
+    attributes = [name for name in table if name not in ('x', 'y')]
+    for name in attributes:
+        layer.CreateField(ogr.FieldDefn(name, ogr_field_type(table[name])))
+
+    # Field names may be shortened by the format (e.g. 10 characters in a shapefile), so fields are set by position
+    layer_defn = layer.GetLayerDefn()
+    columns = [table[name].tolist() for name in attributes]
+    layer.StartTransaction()
+    for i, (x, y) in enumerate(zip(table['x'].tolist(), table['y'].tolist())):
+        feature = ogr.Feature(layer_defn)
+        point = ogr.Geometry(ogr.wkbPoint)
+        point.AddPoint_2D(x, y)
+        feature.SetGeometry(point)
+        for field_index, column in enumerate(columns):
+            feature.SetField(field_index, column[i])
+        layer.CreateFeature(feature)
+    layer.CommitTransaction()
+
+    out_ds = None  # Flush to disk
+    return True
+
+
+def write_point_csv(table, output_path):
+    # Writes a table as CSV with the point coordinates in the first two columns (X, Y)
+    names = list(table)
+    header = ['X' if name == 'x' else 'Y' if name == 'y' else name for name in names]
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(zip(*(table[name].tolist() for name in names)))
+    return output_path
+
+
+# -- Partitioned Parquet dataset
+# Year/Month are stored in the folder names (Year=2020/Month=07), hive style, not in the files
+PARTITIONING = {'Year': 'int16', 'Month': 'int8'}
+CATEGORICAL_KEY = b'categorical_columns'  # Schema metadata listing the columns read back as categoricals
+
+
+def write_point_partition(table, dataset_dir, year, month_num, float32_columns=(), categorical_columns=()):
+    """
+    Writes one month of a table as a Parquet file in a dataset partitioned by Year and Month.
+    The month's file is replaced if it already exists, so a month can be rewritten on its own.
+
+    Parameters:
+    - float32_columns: Columns stored as float32 (e.g. the sampled climate values).
+    - categorical_columns: Columns read back as pandas categoricals (e.g. Fuel_Type). Integer codes are stored
+      as int16, since Parquet only keeps dictionary types for strings, and listed in the schema metadata.
+
+    Returns:
+    - str: Path of the written file.
+    """
+    if pq is None:
+        raise ImportError("pyarrow is required to write Parquet output")
+
+    columns = {}
+    for name, column in table.items():
+        if name in ('Year', 'Month'):  # Stored in the partition folder names
+            continue
+        out_name = 'X' if name == 'x' else 'Y' if name == 'y' else name
+        if name in float32_columns:
+            column = column.astype(np.float32)
+        elif name == 'Fire':
+            column = column.astype(np.int8)
+        elif name in categorical_columns and np.issubdtype(column.dtype, np.integer):
+            column = column.astype(np.int16)
+        columns[out_name] = pa.array(column)
+
+    partition_dir = os.path.join(dataset_dir, f"Year={year}", f"Month={month_num:02d}")
+    os.makedirs(partition_dir, exist_ok=True)
+    output_path = os.path.join(partition_dir, 'part-0.parquet')
+    metadata = {CATEGORICAL_KEY: json.dumps(list(categorical_columns)).encode('utf-8')}
+    pq.write_table(pa.table(columns, metadata=metadata), output_path)
+    return output_path
+
+
+def read_point_dataset(dataset_dir, columns=None, years=None, months=None):
+    """
+    Loads selected columns and Year/Month partitions of the dataset; other partitions are never opened.
+
+    Returns:
+    - pandas.DataFrame: The selected points, with typed Year (int16) and Month (int8) columns.
+    """
+    if ds is None:
+        raise ImportError("pyarrow is required to read Parquet output")
+
+    partitioning = ds.partitioning(
+        pa.schema([(name, getattr(pa, dtype)()) for name, dtype in PARTITIONING.items()]), flavor='hive'
+    )
+    dataset = ds.dataset(dataset_dir, format='parquet', partitioning=partitioning)
+
+    row_filter = None
+    for name, values in (('Year', years), ('Month', months)):
+        if values is not None:
+            condition = ds.field(name).isin(list(values))
+            row_filter = condition if row_filter is None else row_filter & condition
+    points = dataset.to_table(columns=columns, filter=row_filter).to_pandas()
+
+    categorical = json.loads((dataset.schema.metadata or {}).get(CATEGORICAL_KEY, b'[]'))
+    for name in categorical:
+        if name in points:
+            points[name] = points[name].astype('category')
+    return points
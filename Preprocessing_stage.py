@@ -0,0 +1,276 @@
+# Shared preprocessing stage: BC boundary and BC fuel raster used by both pipeline scripts
+import os
+import json
+import math
+import hashlib
+import numpy as np  # Window masking of the fuel raster
+from osgeo import gdal, gdal_array, ogr, osr  # GDAL: Geospatial Data Abstraction Library
+from Geo_backend import get_backend  # GDAL (default) or QGIS geoprocessing
+
+
+# Parameters that define the preprocessing outputs (changing any of them gives new outputs)
+BOUNDARY_PARAMS = {'field': 'PREABBR', 'value': 'B.C.', 'target_crs': 'EPSG:3347'}
+FUEL_PARAMS = {'target_crs': 'EPSG:3347', 'resampling': 'near', 'nodata': -9999, 'tile_size': 2048}
+
+# Creation options for the clipped fuel rasters: tiled and losslessly compressed (no predictor for categorical codes)
+TILED_OPTIONS = ['TILED=YES', 'BLOCKXSIZE=512', 'BLOCKYSIZE=512', 'COMPRESS=DEFLATE', 'SPARSE_OK=TRUE', 'BIGTIFF=IF_SAFER']
+
+MANIFEST_FILE = 'manifest.json'  # Written last, so its presence marks a complete output folder
+HASH_CACHE_FILE = 'file_hashes.json'  # Input file hashes, reused while size and mtime are unchanged
+
+
+# -- Hash the contents of the input files
+def file_hash(path, hash_cache):
+    # Hashing the national fuel grid is slow, so a hash is reused while the file's size and mtime are unchanged
+    stat = os.stat(path)
+    cached = hash_cache.get(path)
+    if cached and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime:
+        return cached['sha256']
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(8 * 1024 * 1024), b''):
+            sha.update(block)
+    hash_cache[path] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': sha.hexdigest()}
+    return sha.hexdigest()
+
+
+def shapefile_parts(shp_path):
+    # A shapefile is several files; the geometry, index, attributes and projection all define its content
+    stem = os.path.splitext(shp_path)[0]
+    return [stem + ext for ext in ('.shp', '.shx', '.dbf', '.prj', '.cpg') if os.path.exists(stem + ext)]
+
+
+def content_key(input_hashes, params):
+    # Key of an output: the hashes of its inputs plus the parameters used to make it
+    payload = json.dumps({'inputs': input_hashes, 'params': params}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+# -- Extract and reproject the BC boundary
+def build_bc_boundary(canada_provinces_path, output_folder, log=print):
+    bc_output_path = os.path.join(output_folder, 'BC_boundary.shp')
+    reprojected_bc_boundary = os.path.join(output_folder, 'BC_boundary_epsg3347.shp')
+    backend = get_backend()
+
+    # Load shapefile of all Canadian provinces
+    if not backend.load_vector(canada_provinces_path, 'Canada Provinces'):
+        log("❌ Canada provinces layer failed to load.")
+        return None
+
+    # Extract just the British Columbia (BC) boundary where province abbreviation (PREABBR) = 'B.C.'
+    if backend.extract_by_attribute(canada_provinces_path, BOUNDARY_PARAMS['field'], BOUNDARY_PARAMS['value'], bc_output_path) is None:
+        log("❌ Failed to extract the BC boundary.")
+        return None
+    log(f"✅ BC boundary extracted and saved to: {bc_output_path}")
+
+    # Reproject the BC boundary to EPSG:3347
+    if backend.reproject_layer(bc_output_path, BOUNDARY_PARAMS['target_crs'], reprojected_bc_boundary) is None:
+        log("❌ Failed to reproject the BC boundary.")
+        return None
+    log("✅ Reprojected BC boundary to EPSG:3347")
+
+    return {'bc_boundary': bc_output_path, 'bc_boundary_3347': reprojected_bc_boundary}
+
+
+# -- Clip a large raster to the BC boundary window by window
+def clip_raster_windowed(input_raster, cutline, output_raster, nodata, tile_size=2048, log=print):
+    """
+    Clips a large single-band raster to the BC boundary without reading all of it. Only the
+    windows inside the boundary's envelope are read; each one is masked with the rasterized
+    boundary and written to a tiled, compressed GeoTIFF in the raster's own CRS. Peak memory
+    is about one tile_size × tile_size window, however large the input raster is.
+
+    Returns:
+    - float: The NoData value of the output (nodata clamped to the raster's data type), or None on failure.
+    """
+    src = gdal.Open(input_raster)
+    if src is None:
+        log(f"❌ Could not open raster: {input_raster}")
+        return None
+    src_band = src.GetRasterBand(1)
+    src_nodata = src_band.GetNoDataValue()  # Source NoData inside BC becomes output NoData, as in gdalwarp
+    gt = src.GetGeoTransform()
+    src_srs = osr.SpatialReference(wkt=src.GetProjection())
+    src_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+    # NoData must fit the data type (for an 8-bit grid, -9999 becomes 0, as gdalwarp does)
+    dtype = gdal_array.GDALTypeCodeToNumericTypeCode(src_band.DataType)
+    if np.issubdtype(dtype, np.integer):
+        nodata = int(min(max(nodata, np.iinfo(dtype).min), np.iinfo(dtype).max))
+
+    # Bring the boundary into the raster's CRS once, as an in-memory layer used for every window
+    cut_ds = ogr.Open(cutline)
+    if cut_ds is None:
+        log(f"❌ Could not open boundary: {cutline}")
+        return None
+    cut_layer = cut_ds.GetLayer()
+    cut_srs = cut_layer.GetSpatialRef()
+    cut_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    transform = osr.CoordinateTransformation(cut_srs, src_srs)
+
+    mem_ds = ogr.GetDriverByName('Memory').CreateDataSource('bc_boundary')
+    mem_layer = mem_ds.CreateLayer('bc_boundary', srs=src_srs, geom_type=ogr.wkbMultiPolygon)
+    for feature in cut_layer:
+        geom = feature.GetGeometryRef().Clone()
+        geom.Transform(transform)
+        out_feature = ogr.Feature(mem_layer.GetLayerDefn())
+        out_feature.SetGeometry(geom)
+        mem_layer.CreateFeature(out_feature)
+    cut_ds = None
+
+    # Pixel window of the boundary envelope, clamped to the raster
+    xmin, xmax, ymin, ymax = mem_layer.GetExtent()
+    col0 = max(0, int(math.floor((xmin - gt[0]) / gt[1])))
+    col1 = min(src.RasterXSize, int(math.ceil((xmax - gt[0]) / gt[1])))
+    row0 = max(0, int(math.floor((ymax - gt[3]) / gt[5])))
+    row1 = min(src.RasterYSize, int(math.ceil((ymin - gt[3]) / gt[5])))
+    if col1 <= col0 or row1 <= row0:
+        log(f"❌ The boundary does not overlap the raster: {input_raster}")
+        return None
+    width, height = col1 - col0, row1 - row0
+
+    out_gt = (gt[0] + col0 * gt[1], gt[1], 0, gt[3] + row0 * gt[5], 0, gt[5])
+    dst = gdal.GetDriverByName('GTiff').Create(output_raster, width, height, 1, src_band.DataType, options=TILED_OPTIONS)
+    dst.SetGeoTransform(out_gt)
+    dst.SetProjection(src.GetProjection())
+    dst_band = dst.GetRasterBand(1)
+    dst_band.SetNoDataValue(nodata)
+
+    mem_driver = gdal.GetDriverByName('MEM')
+    n_windows = 0
+    for y in range(0, height, tile_size):
+        for x in range(0, width, tile_size):
+            w = min(tile_size, width - x)
+            h = min(tile_size, height - y)
+
+            # Rasterize the boundary over this window (pixels whose centre is inside BC)
+            mask_ds = mem_driver.Create('', w, h, 1, gdal.GDT_Byte)
+            mask_ds.SetGeoTransform((out_gt[0] + x * gt[1], gt[1], 0, out_gt[3] + y * gt[5], 0, gt[5]))
+            mask_ds.SetProjection(src.GetProjection())
+            gdal.RasterizeLayer(mask_ds, [1], mem_layer, burn_values=[1])
+            inside = mask_ds.ReadAsArray().astype(bool)
+            mask_ds = None
+
+            # Windows entirely outside BC are never read; sparse tiles read back as NoData
+            if not inside.any():
+                continue
+
+            window = src_band.ReadAsArray(col0 + x, row0 + y, w, h)
+            window[~inside] = nodata
+            if src_nodata is not None:
+                window[np.isnan(window) if math.isnan(src_nodata) else window == src_nodata] = nodata
+            dst_band.WriteArray(window, x, y)
+            n_windows += 1
+
+    dst_band = None
+    dst = None  # Flush to disk
+    src = None
+    log(f"✅ Clipped {n_windows} windows of {input_raster} to the BC boundary.")
+    return nodata
+
+
+# -- Clip and reproject the national fuel raster to BC
+def build_fuel_raster(fuel_raster_path, reprojected_bc_boundary, output_folder, log=print):
+    final_clipped_raster = os.path.join(output_folder, 'BC_fuel_type_epsg3347.tif')
+    clipped_native = os.path.join(output_folder, 'BC_fuel_type_native.tif')
+
+    # Step 1: Stream the BC windows of the national grid into a tiled, compressed raster in its own CRS
+    nodata = clip_raster_windowed(fuel_raster_path, reprojected_bc_boundary, clipped_native,
+                                  FUEL_PARAMS['nodata'], FUEL_PARAMS['tile_size'], log)
+    if nodata is None:
+        log(f"❌ Failed to clip fuel raster: {fuel_raster_path}")
+        return None
+
+    # Step 2: Reproject the (much smaller) BC raster to EPSG:3347, unless it is already in it
+    native_ds = gdal.Open(clipped_native)
+    native_srs = osr.SpatialReference(wkt=native_ds.GetProjection())
+    native_ds = None  # Close before the file is moved or removed
+    target_srs = osr.SpatialReference()
+    target_srs.SetFromUserInput(FUEL_PARAMS['target_crs'])
+    if native_srs.IsSame(target_srs):
+        os.replace(clipped_native, final_clipped_raster)
+    else:
+        # Nearest neighbor resampling for categorical data; the source NoData is read from the clipped raster
+        if get_backend().warp_reproject(clipped_native, final_clipped_raster, FUEL_PARAMS['target_crs'], nodata,
+                                        FUEL_PARAMS['resampling'], creation_options=TILED_OPTIONS) is None:
+            log(f"❌ Failed to reproject fuel raster: {clipped_native}")
+            return None
+        os.remove(clipped_native)
+
+    log("✅ Reprojected fuel raster to EPSG:3347 successfully.")
+    return {'fuel_raster': final_clipped_raster}
+
+
+def run_cached(stage_dir, key, build, log=print):
+    """
+    Runs a preprocessing step only if its content-addressed output folder is not complete yet.
+
+    Returns:
+    - dict: Output paths of the step, or None if it failed.
+    """
+    output_folder = os.path.join(stage_dir, key)
+    manifest_path = os.path.join(output_folder, MANIFEST_FILE)
+
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            outputs = json.load(f)['outputs']
+        if all(os.path.exists(path) for path in outputs.values()):
+            log(f"ℹ️ Reusing preprocessed outputs in {output_folder}")
+            return outputs
+
+    os.makedirs(output_folder, exist_ok=True)
+    outputs = build(output_folder)
+    if outputs is None:
+        return None
+
+    with open(manifest_path, 'w') as f:
+        json.dump({'key': key, 'outputs': outputs}, f, indent=2)
+    return outputs
+
+
+# -- Run the whole preprocessing stage
+def run_preprocessing(base_dir, log=print):
+    """
+    Prepares the BC boundary (original CRS and EPSG:3347) and the BC fuel type raster.
+    Outputs are stored under Preprocessed/ in folders named after the hashes of their input
+    files and parameters, so every run of either script reuses them until an input changes.
+
+    Returns:
+    - dict: Paths 'bc_boundary', 'bc_boundary_3347' and 'fuel_raster', or None if a step failed.
+    """
+    canada_provinces_path = os.path.join(base_dir, 'Map_of_Canada/lpr_000b16a_e.shp')
+    fuel_raster_path = os.path.join(base_dir, 'National_FBP_Fueltypes_version2014b/nat_fbpfuels_2014b.tif')
+    preprocessed_dir = os.path.join(base_dir, 'Preprocessed')
+    os.makedirs(preprocessed_dir, exist_ok=True)
+
+    hash_cache_path = os.path.join(preprocessed_dir, HASH_CACHE_FILE)
+    hash_cache = {}
+    if os.path.exists(hash_cache_path):
+        with open(hash_cache_path, 'r') as f:
+            hash_cache = json.load(f)
+
+    # Stage 1: BC boundary, keyed by the Canada shapefile and the extraction parameters
+    boundary_key = content_key(
+        [file_hash(path, hash_cache) for path in shapefile_parts(canada_provinces_path)], BOUNDARY_PARAMS
+    )
+    boundary = run_cached(
+        os.path.join(preprocessed_dir, 'BC_boundary'), boundary_key,
+        lambda folder: build_bc_boundary(canada_provinces_path, folder, log), log
+    )
+
+    # Stage 2: BC fuel raster, keyed by the national fuel grid, the boundary and the warp parameters
+    fuel = None
+    if boundary is not None:
+        fuel_key = content_key([file_hash(fuel_raster_path, hash_cache), boundary_key], FUEL_PARAMS)
+        fuel = run_cached(
+            os.path.join(preprocessed_dir, 'BC_fuel_type'), fuel_key,
+            lambda folder: build_fuel_raster(fuel_raster_path, boundary['bc_boundary_3347'], folder, log), log
+        )
+
+    with open(hash_cache_path, 'w') as f:
+        json.dump(hash_cache, f, indent=2)
+
+    if boundary is None or fuel is None:
+        return None
+    return {**boundary, **fuel}
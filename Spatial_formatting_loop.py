@@ -1,184 +1,148 @@
-# Import QGIS and geospatial processing libraries
-import processing  # Enables access to QGIS's built-in processing toolbox algorithms
+# Import geospatial processing libraries (QGIS is only imported when its backend or map layers are used)
 import sys
 import os
-import random
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import struct  # Packing candidate points into WKB for bulk point-in-polygon tests
 from datetime import datetime, timezone, timedelta  # For date/time operations
-from qgis.analysis import QgsNativeAlgorithms  # Provides access to QGIS-native algorithms
-from qgis.PyQt.QtCore import QVariant  # Used for defining attribute data types
 from pyproj import Transformer  # Used to convert coordinates between projections
 import re
 import math
-from osgeo import gdal  # Core GDAL library for raster I/O
-from processing.core.Processing import Processing  # Initializes the QGIS processing framework
-from qgis.core import (  # QGIS core classes used throughout the script
-    QgsVectorLayer, QgsProject, QgsProcessingContext, 
-    QgsProcessingFeedback, edit, QgsApplication, 
-    QgsProcessingFeatureSourceDefinition, QgsRasterLayer,
-    QgsRasterBandStats, QgsField, QgsFeature, QgsGeometry,
-    QgsPointXY, QgsVectorFileWriter, 
-    QgsCoordinateReferenceSystem, QgsProcessingProvider, QgsFields
+from osgeo import gdal, ogr, osr  # Core GDAL library for raster/vector I/O and spatial references
+import numpy as np  # Array math for sampling climate values
+from scipy.spatial import Delaunay, cKDTree  # BC triangulation for uniform sampling, fire point lookups
+from Climate_datacube import (  # Multi-year climate datacube
+    open_climate_datacube, datacube_month, sample_climate_datacube, CUBE_FILE, METADATA_FILE
+)
+from Preprocessing_stage import run_preprocessing  # Shared BC boundary / fuel raster stage
+from Geo_backend import get_backend, read_raster_array, sample_raster_array  # GDAL (default) or QGIS geoprocessing
+from Stage_runner import StageRunner, parse_run_arguments  # Resumable (year, month) stages
+from Point_table import (  # Columnar point tables passed between the stages
+    make_point_table, point_table_length, concat_point_tables, filter_point_table, write_point_table, write_point_csv,
+    write_point_partition, pq
 )
-from processing.algs.gdal.GdalAlgorithmProvider import GdalAlgorithmProvider  # GDAL algorithm access for processing
 import csv  # Used for reading/writing tabular data
+import json  # Fuel grid metadata
 from collections import defaultdict  # For structured default dictionary use
 from dateutil import parser  # To handle date parsing and formatting
 import logging  # For tracking script progress and logging messages
 
-# -------------------------------------------
-# Initialize the QGIS Processing framework.
-# This step is mandatory to use any of QGIS’s built-in tools via Python.
-Processing.initialize()
-
-# Register algorithm providers so we can call their tools later.
-# Native QGIS tools and GDAL tools are required for operations like reprojecting or clipping.
-QgsApplication.processingRegistry().addProvider(QgsNativeAlgorithms())
-QgsApplication.processingRegistry().addProvider(GdalAlgorithmProvider())
-
-logging.info("✅ GDAL Processing tools enabled.")
-
 # -------------------------------------------
 # Define the base folder where all your shapefiles and raster files are stored
 base_dir = 'C:/Users/tdoa2/OneDrive/Desktop/Data analytics/BCIT Data Analytics Certificate/BABI 9050/Code/Spatial data analysis/Spatial data cleaning'
 
-# Define path to the Canada provinces shapefile (.shp is a common geospatial vector format)
-canada_provinces_path = os.path.join(base_dir, 'Map_of_Canada/lpr_000b16a_e.shp')
-
-# Load the shapefile as a vector layer. If it’s valid, it can be used for operations like filtering and clipping.
-canada_layer = QgsVectorLayer(canada_provinces_path, 'Canada Provinces', 'ogr')
-
-
-# Check whether the Canada provinces shapefile loaded successfully.
-# QGIS layers can sometimes fail to load due to incorrect paths, corrupt files, or unsupported formats.
-
-if not canada_layer.isValid():
-    # If the layer is not valid, log an error message.
-    logging.info("❌ Canada provinces layer failed to load.")
-else:
-    # If the layer is valid, log a success message.
-    logging.info("✅ Canada provinces layer created.")
-
 # Logging system
 # Define the path to a log file where the script will record its activity.
 log_path = os.path.join(base_dir, 'script_logs.log')
 
 # Configure Python's logging module to write INFO-level logs to the file,
 # with timestamps and messages included in each log entry.
+# (Worker processes import this script too, so their messages go to the same log file.)
 logging.basicConfig(filename=log_path, level=logging.INFO, format='%(asctime)s %(message)s')
 
+backend = None  # Geoprocessing backend ('gdal' or 'qgis', from BC_WILDFIRE_BACKEND), set by init_processing()
+reprojected_bc_boundary = None  # BC boundary in EPSG:3347, set from the shared preprocessing stage
+final_clipped_raster = None  # BC fuel type raster in EPSG:3347, set from the shared preprocessing stage
+bc_geometry = None  # BC boundary as a single OGR geometry, set by load_bc_geometry()
 
-# --- Extract British Columbia boundary
-# Define the output file path where the British Columbia boundary shapefile will be saved.
-bc_output_path = os.path.join(base_dir, 'Map_of_Canada/BC_boundary.shp')
-
-# Use QGIS's 'extract by attribute' tool to select British Columbia from the Canada shapefile.
-# 'PREABBR' is the field containing province abbreviations (like 'B.C.').
-# This process filters the national shapefile to isolate only British Columbia's geometry.
-processing.run("native:extractbyattribute", {
-    'INPUT': canada_layer,   # Input shapefile with all provinces
-    'FIELD': 'PREABBR',      # Field to filter on (province abbreviation)
-    'OPERATOR': 0,           # Operator 0 means 'equals'
-    'VALUE': 'B.C.',         # Value to match (British Columbia)
-    'OUTPUT': bc_output_path # Output path for the new shapefile
-})
-logging.info("✅ BC boundary extracted and saved to:", bc_output_path)
-
-
-# --- Load BC layer
-# Load the newly created British Columbia shapefile into QGIS as a vector layer.
-bc_boundary_layer = QgsVectorLayer(bc_output_path, 'BC Boundary', 'ogr')
-
-# Check if the layer loaded correctly.
-# If it did, log a success message. If not, log a failure message.
-if bc_boundary_layer.isValid():
-    logging.info("✅ BC Boundary layer created.")
-else:
-    logging.info("❌ Failed to load BC Boundary layer.")
-
-# === STEP: Reproject BC Boundary to EPSG:3347 ===
-# Reprojection converts spatial data from one coordinate reference system (CRS) to another.
-# EPSG:3347 is a common projected CRS for Canada, which allows for more accurate distance calculations.
-reprojected_bc_boundary = os.path.join(base_dir, 'Map_of_Canada/BC_boundary_epsg3347.shp')
-
-# Use QGIS to reproject the BC boundary shapefile from its original CRS to EPSG:3347.
-processing.run("native:reprojectlayer", {
-    'INPUT': bc_output_path,  # Path to the original BC shapefile
-    'TARGET_CRS': QgsCoordinateReferenceSystem('EPSG:3347'),  # The target coordinate system
-    'OUTPUT': reprojected_bc_boundary  # Output file path for the reprojected layer
-})
-logging.info("✅ Reprojected BC boundary to EPSG:3347")
-
-# Load the newly reprojected shapefile into QGIS
-bc_boundary_layer_3347 = QgsVectorLayer(reprojected_bc_boundary, 'BC Boundary (EPSG:3347)', 'ogr')
-
-# Check if the reprojected layer loaded properly
-if bc_boundary_layer_3347.isValid():
-    QgsProject.instance().addMapLayer(bc_boundary_layer_3347)  # Add it to the map/project
-    logging.info("✅ Reprojected BC boundary layer created successfully.")
-else:
-    logging.info("❌ Failed to load reprojected BC boundary layer.")
-
-# --- Clip and reproject Fuel Raster
-# Define file paths for the original and processed versions of the fuel type raster
-fuel_raster_path = os.path.join(base_dir, 'National_FBP_Fueltypes_version2014b/nat_fbpfuels_2014b.tif')
-clipped_raster_temp = os.path.join(base_dir, 'National_FBP_Fueltypes_version2014b/temp_clipped_fuel.tif')
-final_clipped_raster = os.path.join(base_dir, 'National_FBP_Fueltypes_version2014b/BC_fuel_type_epsg3347.tif')
-
-# Clip the national fuel type raster to the shape of British Columbia
-# This isolates only the BC portion of the raster to reduce processing time and improve focus
-processing.run("gdal:cliprasterbymasklayer", {
-    'INPUT': fuel_raster_path,           # Original full raster
-    'MASK': reprojected_bc_boundary,     # Use the BC boundary as the mask
-    'SOURCE_CRS': None,                  # CRS is auto-detected
-    'TARGET_CRS': None,
-    'NODATA': -9999,                     # Assign -9999 to areas outside BC
-    'ALPHA_BAND': False,
-    'CROP_TO_CUTLINE': True,            # Crop the raster tightly to BC boundary
-    'KEEP_RESOLUTION': True,            # Preserve original resolution
-    'OPTIONS': '',
-    'DATA_TYPE': 0,                     # Same data type as input
-    'EXTRA': '',
-    'OUTPUT': clipped_raster_temp        # Save temporary clipped raster
-})
-logging.info("✅ Temporary clipped fuel raster created.")
-
-# If the clipping was successful and the temp file exists
-if os.path.exists(clipped_raster_temp):
-    # Reproject the clipped raster to EPSG:3347 to align it with other layers
-    processing.run("gdal:warpreproject", {
-        'INPUT': clipped_raster_temp,
-        'SOURCE_CRS': None,
-        'TARGET_CRS': 'EPSG:3347',
-        'RESAMPLING': 0,                 # Nearest neighbor resampling for categorical data
-        'NODATA': None,
-        'TARGET_RESOLUTION': None,
-        'OPTIONS': '',
-        'DATA_TYPE': 0,
-        'TARGET_EXTENT': None,
-        'TARGET_EXTENT_CRS': None,
-        'MULTITHREADING': False,
-        'OUTPUT': final_clipped_raster   # Final output raster
-    })
-    logging.info("✅ Reprojected raster to EPSG:3347 successfully.")
 
-    # Load the reprojected fuel raster as a QGIS layer
-    reprojected_fuel_layer = QgsRasterLayer(final_clipped_raster, "BC Fuel Type (EPSG:3347)")
-    if reprojected_fuel_layer.isValid():
+# -------------------------------------------
+# Initialize the geoprocessing backend.
+def init_processing(backend_name=None):
+    # The GDAL backend needs no QGIS application; the QGIS backend starts one only if it is selected
+    global backend
+    backend = get_backend(backend_name)
+    logging.info(f"✅ {backend.name.upper()} geoprocessing backend enabled.")
+
+
+# --- Shared preprocessing: BC boundary and BC fuel raster
+def prepare_inputs():
+    # Extracting BC from the Canada shapefile, reprojecting it to EPSG:3347 and clipping the national
+    # fuel type raster are done by a shared stage. Its outputs are stored under folders named after the
+    # hashes of the input files and parameters, so they are reused by both scripts until an input changes.
+    preprocessed = run_preprocessing(base_dir, log=logging.info)
+    if preprocessed is None:
+        logging.info("❌ Preprocessing of the BC boundary and fuel raster failed.")
+        return None
+
+    # Load the reprojected BC boundary (and add it to the QGIS project when running in QGIS)
+    if backend.load_vector(preprocessed['bc_boundary_3347'], 'BC Boundary (EPSG:3347)', add_to_project=True):
+        logging.info("✅ Reprojected BC boundary layer created successfully.")
+    else:
+        logging.info("❌ Failed to load reprojected BC boundary layer.")
+
+    # Load the reprojected fuel raster and add it to the project if it is valid
+    if backend.load_raster(preprocessed['fuel_raster'], "BC Fuel Type (EPSG:3347)", add_to_project=True):
         logging.info("✅ Reprojected raster added to project.")
-        QgsProject.instance().addMapLayer(reprojected_fuel_layer)
     else:
         logging.info("❌ Failed to load reprojected raster.")
-else:
-    logging.info(f"❌ File not found: {clipped_raster_temp}")
-    
-    
-    
+
+    return preprocessed
+
+
+def load_bc_geometry(boundary_path):
+    # BC boundary as a single OGR geometry, used to keep only the hotspots and random points that fall inside the province
+    bc_boundary_ds = ogr.Open(boundary_path)
+    if bc_boundary_ds is None:
+        logging.info(f"❌ Could not open the reprojected BC boundary: {boundary_path}")
+        return None
+    geometry = None
+    for bc_feature in bc_boundary_ds.GetLayer():
+        bc_geom = bc_feature.GetGeometryRef()
+        geometry = bc_geom.Clone() if geometry is None else geometry.Union(bc_geom)
+    bc_boundary_ds = None
+    return geometry
+
+
+
 # === PARAMETERS
 start_year = 2000
 end_year = 2024
 # These two variables define the time range (in years) for the wildfire analysis.
 # The script will loop through each year from 2000 to 2024.
 
+climate_sampling = 'datacube'     # 'datacube' samples the multi-year climate datacube (falls back to the monthly stack for missing months),
+                                  # 'native' or 'raster' sample each monthly stack in its own CRS (lat/lon for the native ERA5 grid)
+climate_interpolation = 'nearest' # 'nearest' or 'bilinear' lookup when climate_sampling is 'native'
+# 'datacube' and 'native' expect reproject_climate = False in Climate_extraction_loop.py.
+
+bc_mask_resolution = 250  # Cell size (m) of the cached BC membership raster used for point-in-BC tests
+
+non_fire_sampler = 'triangulation'  # 'triangulation' draws area-uniform points from cached BC triangles (no rejection),
+                                    # 'rejection' draws over BC's bounding box and keeps the points inside BC
+output_format = 'parquet'  # 'parquet' writes one dataset partitioned by Year/Month, 'csv' writes monthly CSVs and a combined CSV
+points_dataset_dir = os.path.join(base_dir, 'Point_data/Sampled/Sampled_Points.parquet')  # Parquet dataset of all sampled points
+if output_format == 'parquet' and pq is None:
+    logging.info("⚠️ pyarrow is not installed. Writing CSV output instead of Parquet.")
+    output_format = 'csv'
+
+artifact_level = 'final-only'  # 'final-only' writes only the sampled points dataset; intermediates stay in memory or /vsimem,
+                               # 'debug' also saves the reprojected hotspot, non-fire and merged point files,
+                               # 'none' writes nothing to disk (the cleaned points are only kept in memory)
+
+# Years and months to process, from the command line (e.g. --years 2024 --months 8 redoes August 2024 only).
+# Finished stages are recorded in per-year manifests; a rerun skips the months whose export is still valid
+# (same inputs and parameters) and reuses each year's hotspot partition. --force reruns the selection anyway.
+selected_years, selected_months, force_rerun = parse_run_arguments(sys.argv[1:], start_year, end_year)
+stage_manifest_dir = os.path.join(base_dir, 'Point_data/Stage_manifests')
+runner = StageRunner(stage_manifest_dir, enabled=artifact_level != 'none', force=force_rerun)
+
+point_workers = os.cpu_count() or 1  # Worker processes for the per-month point pipeline (1 = run serially)
+if sys.platform == 'win32':
+    point_workers = min(point_workers, 61)  # ProcessPoolExecutor allows at most 61 workers on Windows
+random_seed = 2025  # Base seed of the non-fire points; each (year, month) draws from its own seeded stream,
+                    # so the points of a month do not depend on the number of workers or the months that ran before
+
+load_layers_into_qgis = False  # Also add each month's cleaned points to the QGIS project as a memory layer (slow on big months)
+non_fire_exclusion_distance = 0  # Non-fire points closer than this (m) to a fire point of the same month are redrawn (0 = off)
+
+# Open the multi-year climate datacube built by Climate_extraction_loop.py (memory-mapped, nothing is read yet)
+climate_cube_dir = os.path.join(base_dir, 'climate_data/Climate_datacube')
+climate_cube = open_climate_datacube(climate_cube_dir) if climate_sampling == 'datacube' else None
+if climate_sampling == 'datacube' and climate_cube is None:
+    logging.info(f"⚠️ No climate datacube found in {climate_cube_dir}. Sampling monthly stacks instead.")
+
 # --- Months dictionary
 month_words = {
     1: 'January', 2: 'February', 3: 'March', 4: 'April',
@@ -193,147 +157,279 @@ fire_counts = {}  # This dictionary will store how many fire points were found f
 non_fire_counts = {}  # This will store how many non-fire (random) points should be generated for each (year, month).
 yearly_fire_counts = defaultdict(list)  # This will hold lists of monthly fire counts for each year (for averaging later).
 
-# Store all reprojected layers so we don't recompute
-reprojected_hotspot_layers = {}
-# This dictionary caches reprojected hotspot layers per year to avoid repeating the reprojection process,
-# which saves time and computing resources.
+# Monthly fire sets from the first pass, reused by the second pass instead of filtering the hotspots again
+hotspot_cache_in_memory = True  # False spills each year's monthly sets to a compressed .npz file on disk
+hotspot_cache_dir = os.path.join(base_dir, 'Point_data/Hotspot data/Monthly_hotspot_cache')
+monthly_hotspot_cache = {}  # year -> monthly sets (in memory) or path to the year's .npz file (spilled)
+
+# Cleaned points of every month, combined into one table at the end of the run ('none' artifact level)
+all_clean_points = []
 
-# BC Boundary features
-spatial_index = QgsSpatialIndex(bc_boundary_layer_3347.getFeatures())
-# A spatial index is a data structure that helps QGIS quickly find features (like regions or polygons) that
-# intersect with a given point or geometry. It speeds up spatial queries.
+# Random number generator for the non-fire points, reseeded from (random_seed, year, month) for every month
+rng = np.random.default_rng()
 
-boundary_features = {f.id(): f for f in bc_boundary_layer_3347.getFeatures()}
-# This creates a dictionary of all features (geometric shapes) in the BC boundary layer,
-# keyed by their unique ID. This allows fast lookup of boundary features during point-in-polygon checks,
-# such as when generating random points within BC.
+# EPSG:3347 → WGS84 (EPSG:4326) transformer, created once and applied to whole coordinate arrays
+wgs84_transformer = Transformer.from_crs("EPSG:3347", "EPSG:4326", always_xy=True)
+
+
+def to_wgs84(xs, ys):
+    # Converts arrays of EPSG:3347 coordinates to latitudes and longitudes in one pyproj call
+    lons, lats = wgs84_transformer.transform(np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64))
+    return lats, lons
 
 
 
 # == FUNCTIONS
+# -- Intermediate file policy
+def keep_intermediates():
+    # Intermediate files are only saved to disk at the 'debug' artifact level
+    return artifact_level == 'debug'
+
+
+def intermediate_path(path):
+    # Returns where an intermediate vector file is written: its normal path at the 'debug' level,
+    # otherwise the same relative path in GDAL's in-memory filesystem (/vsimem), so nothing hits disk
+    if keep_intermediates():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+    return '/vsimem/' + os.path.relpath(path, base_dir).replace('\\', '/')
+
+
+def release_intermediate(path):
+    # Frees an in-memory intermediate file (and its .shx/.dbf/.prj companions) once it has been read
+    if path and path.startswith('/vsimem/'):
+        ogr.GetDriverByName('ESRI Shapefile').DeleteDataSource(path)
+
+
 # -- Get fire hotspots files
+def get_hotspot_path(year):
+    return os.path.join(base_dir, f"Point_data/Hotspot data/{year}_hotspots/{year}_hotspots.shp")
+
+
 def get_hotspots(year):
-    # Load the shapefile that contains fire hotspot points for a specific year.
+    # Check the shapefile that contains fire hotspot points for a specific year.
     # Each shapefile has information about where and when fires occurred.
-    hotspot_path = os.path.join(base_dir, f"Point_data/Hotspot data/{year}_hotspots/{year}_hotspots.shp")
-    hotspot_layer = QgsVectorLayer(hotspot_path, f"Hotspots {year}", 'ogr')  # Load using the OGR driver (used for vector files)
+    hotspot_path = get_hotspot_path(year)
     
-    # Check if the layer loaded correctly
-    if not hotspot_layer.isValid():
+    # Check if the layer loads correctly
+    if not backend.load_vector(hotspot_path, f"Hotspots {year}"):
         logging.info("❌ Hotspot shapefile failed to load.")
         return
     else:
         logging.info(f"✅ {year} Hotspot layer created.")
-    return hotspot_layer  # Return the loaded vector layer of fire points
+    return hotspot_path  # Return the path of the fire points shapefile
 
     
-def reproject_hotspot_layer(hotspot_layer, year):
-    # Reprojects the hotspot layer to a different coordinate system (EPSG:3347) 
+def reproject_hotspot_layer(hotspot_path, year):
+    # Reprojects the hotspot layer to a different coordinate system (EPSG:3347)
     # to ensure consistency with other geographic layers like climate or fuel maps.
-    
-    reprojected_hotspot_folder = os.path.join(base_dir, f"Point_data/Hotspot data/{year}_hotspots/Reprojected_hotspot_files")
-    os.makedirs(reprojected_hotspot_folder, exist_ok=True)
-    reprojected_hotspot_path = os.path.join(reprojected_hotspot_folder, f"{year}_reprojected.shp")
-
-    # Only perform reprojection if the file doesn't already exist
-    if not os.path.exists(reprojected_hotspot_path):
-        processing.run("native:reprojectlayer", {
-            'INPUT': hotspot_layer,  # original data
-            'TARGET_CRS': QgsCoordinateReferenceSystem('EPSG:3347'),  # target coordinate system
-            'OUTPUT': reprojected_hotspot_path  # file to save the reprojected layer
-        })
-        logging.info(f"✅ Reprojected hotspot layer for {year} saved.")
-    else:
+    # Returns the path of the reprojected file, which is in /vsimem unless artifact_level is 'debug'.
+    if hotspot_path is None:
+        return None
+
+    reprojected_hotspot_path = intermediate_path(os.path.join(
+        base_dir, f"Point_data/Hotspot data/{year}_hotspots/Reprojected_hotspot_files/{year}_reprojected.shp"
+    ))
+
+    # Only perform reprojection if the file doesn't already exist (saved files are reused between debug runs)
+    if os.path.exists(reprojected_hotspot_path):
         logging.info(f"ℹ️ Reprojected hotspot file for {year} already exists.")
+        return reprojected_hotspot_path
 
-    # Load and return the reprojected hotspot layer
-    reprojected_hotspot_layer = QgsVectorLayer(reprojected_hotspot_path, f"Reprojected {year} Hotspots", 'ogr')
-    if not isinstance(reprojected_hotspot_layer, QgsVectorLayer):
-        logging.error("❌ Input is not a vector layer. Make sure to pass a QgsVectorLayer, not a raster.")
+    # An in-memory copy is written by the GDAL backend, as only it is sure to see this process's /vsimem
+    reproject_backend = get_backend('gdal') if reprojected_hotspot_path.startswith('/vsimem/') and not backend.supports_vsimem else backend
+    if reproject_backend.reproject_layer(hotspot_path, 'EPSG:3347', reprojected_hotspot_path) is None:
+        logging.error(f"❌ Failed to reproject the {year} hotspot layer.")
         return None
-    return reprojected_hotspot_layer
+    logging.info(f"✅ Reprojected hotspot layer for {year} written to {reprojected_hotspot_path}.")
+    return reprojected_hotspot_path
 
-def get_monthly_hotspot_data(month_num, month_name, year, reprojected_hotspot_layer):
-    # Extracts and filters fire hotspot data to only include points from a specific year and month.
-    
-    # Identify the name of the date field used in the layer
-    field_names = [field.name() for field in reprojected_hotspot_layer.fields()]
-    if 'REP_DATE' in field_names:
-        date_field = 'REP_DATE'
-    elif 'rep_date' in field_names:
-        date_field = 'rep_date'
-    else:
-        logging.info(f"⚠️ {year} hotspot layer: No REP_DATE or rep_date field.")
-        return None
+# -- Parse hotspot report dates
+def parse_hotspot_dates(raw_dates):
+    """
+    Extracts the year and month of every hotspot report date in one vectorized step.
+    Dates come as "YYYY/MM/DD HH:MM:SS.fff" or "YYYY-MM-DD HH:MM:SS"; both start with a
+    YYYY?MM?DD prefix, so the digits are read straight from the first 10 characters.
+    Dates in any other format fall back to dateutil, one at a time.
 
-    # Filter hotspot features to include only those with a date matching the specified month and year
-    selected_features = []
-    for feature in reprojected_hotspot_layer.getFeatures():
+    Returns:
+    - (np.ndarray, np.ndarray): Year and month of each date, 0 where the date is missing or unreadable.
+    """
+    if len(raw_dates) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    dates = np.char.replace(np.asarray(raw_dates, dtype=str), '/', '-')
+    chars = dates.astype('U10').view('U1').reshape(len(dates), 10)  # First 10 characters, '' past the end
+
+    digit_positions = [0, 1, 2, 3, 5, 6, 8, 9]
+    is_digit = np.char.isdigit(chars[:, digit_positions]).all(axis=1)
+    matched = is_digit & (chars[:, 4] == '-') & (chars[:, 7] == '-')
+
+    digits = np.where(np.char.isdigit(chars), chars, '0').astype(np.int64)
+    years = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    months = digits[:, 5] * 10 + digits[:, 6]
+    matched &= (months >= 1) & (months <= 12)
+    years[~matched] = 0
+    months[~matched] = 0
+
+    for i in np.flatnonzero(~matched):
+        raw_date = raw_dates[i]
+        if not raw_date:
+            continue
         try:
-            raw_date = feature[date_field]
-            if not raw_date:
-                continue
             date_obj = parser.parse(str(raw_date))  # Convert the date text into a date object
-            if date_obj.year == year and date_obj.month == month_num:
-                selected_features.append(feature)
+            years[i], months[i] = date_obj.year, date_obj.month
         except Exception as e:
             logging.info(f"⚠️ Skipping feature with bad date: {raw_date}, error: {e}")
 
-    # If no features match the criteria, return None
-    if not selected_features:
-        logging.info(f"⚠️ {month_name} {year}: No features matched the date.")
+    return years, months
+
+
+# -- Split a year of hotspots into months
+def partition_hotspots_by_month(year, hotspot_path):
+    """
+    Reads the year's reprojected hotspot file once, keeps the points inside the BC boundary
+    and splits them into the 12 months of the year.
+
+    Returns:
+    - dict: For each month number, a dict of arrays 'x', 'y' (EPSG:3347), 'lat', 'lon' and 'rep_date'
+      (empty arrays for months without fires). None if the layer cannot be read.
+    """
+    hotspot_ds = ogr.Open(hotspot_path) if hotspot_path else None
+    if hotspot_ds is None:
+        logging.info(f"❌ Could not open {year} hotspot layer: {hotspot_path}")
         return None
+    hotspot_layer = hotspot_ds.GetLayer()
 
-    # Prepare a list of new features with correct geometry and attributes
-    new_features = []
-    for feat in selected_features:
-        geom = feat.geometry()
-        if geom is None or geom.isEmpty():
-            continue
-        new_feat = QgsFeature()
-        new_feat.setFields(reprojected_hotspot_layer.fields())
-        new_feat.setGeometry(QgsGeometry(geom))  # Create a deep copy of the geometry
-        for field in reprojected_hotspot_layer.fields():
-            new_feat.setAttribute(field.name(), feat[field.name()])
-        new_features.append(new_feat)
-
-    # Create a new temporary memory layer to store the filtered features, using the correct coordinate system (EPSG:3347)
-    temp_layer = QgsVectorLayer("Point?crs=EPSG:3347", f"{year}_{month_name}_Hotspots", "memory")
-    temp_layer.dataProvider().addAttributes(reprojected_hotspot_layer.fields())
-    temp_layer.updateFields()
-    temp_layer.dataProvider().addFeatures(new_features)
-    temp_layer.updateExtents()
-
-    # Check that the new layer is valid
-    if temp_layer.isValid():
-        logging.info(f"ℹ️ {month_name} {year}: Filtered layer has {temp_layer.featureCount()} features.")
+    # Identify the names of the date and coordinate fields used in the layer
+    layer_defn = hotspot_layer.GetLayerDefn()
+    field_names = [layer_defn.GetFieldDefn(i).GetName() for i in range(layer_defn.GetFieldCount())]
+    if 'REP_DATE' in field_names:
+        date_field = 'REP_DATE'
+    elif 'rep_date' in field_names:
+        date_field = 'rep_date'
     else:
-        logging.info(f"❌ {month_name} {year} layer is not valid.")
+        logging.info(f"⚠️ {year} hotspot layer: No REP_DATE or rep_date field.")
         return None
-
-    # Clip the filtered hotspots to the BC boundary so that only points inside the province are kept
-    if not bc_boundary_layer_3347.isValid():
-        logging.info("❌ BC boundary layer is not valid.")
+    lat_field = 'LAT' if 'LAT' in field_names else 'lat'
+    lon_field = 'LON' if 'LON' in field_names else 'lon'
+
+    # Only read the fields that are needed, and only the points in BC's bounding box
+    hotspot_layer.SetIgnoredFields([name for name in field_names if name not in (date_field, lat_field, lon_field)])
+    xmin, xmax, ymin, ymax = bc_geometry.GetEnvelope()
+    hotspot_layer.SetSpatialFilterRect(xmin, ymin, xmax, ymax)
+
+    xs, ys, lats, lons, raw_dates = [], [], [], [], []
+    for feature in hotspot_layer:
+        geom = feature.GetGeometryRef()
+        if geom is None or geom.IsEmpty():
+            continue
+        xs.append(geom.GetX())
+        ys.append(geom.GetY())
+        lats.append(feature.GetField(lat_field))
+        lons.append(feature.GetField(lon_field))
+        raw_dates.append(feature.GetField(date_field))
+    hotspot_ds = None
+
+    xs = np.array(xs, dtype=np.float64)
+    ys = np.array(ys, dtype=np.float64)
+    lats = np.array(lats, dtype=np.float64)
+    lons = np.array(lons, dtype=np.float64)
+    rep_dates = np.array([str(d) if d else '' for d in raw_dates], dtype=str)
+
+    # Hotspots without LAT/LON attributes get them from their reprojected coordinates
+    no_coords = np.isnan(lats) | np.isnan(lons)
+    if no_coords.any():
+        lats[no_coords], lons[no_coords] = to_wgs84(xs[no_coords], ys[no_coords])
+    years, months = parse_hotspot_dates(raw_dates)
+
+    # Keep the points inside BC (replaces clipping each month)
+    years[~bc_contains(xs, ys)] = 0
+
+    # Group the points by month with one stable sort instead of 12 scans of the layer
+    in_year = np.flatnonzero(years == year)
+    order = in_year[np.argsort(months[in_year], kind='stable')]
+    bounds = np.searchsorted(months[order], np.arange(1, 14))
+
+    monthly_hotspots = {}
+    for month_num in range(1, 13):
+        idx = order[bounds[month_num - 1]:bounds[month_num]]
+        monthly_hotspots[month_num] = {
+            'x': xs[idx], 'y': ys[idx], 'lat': lats[idx], 'lon': lons[idx], 'rep_date': rep_dates[idx]
+        }
+
+    logging.info(f"✅ {year}: Partitioned {len(in_year)} hotspots inside BC into months.")
+    return monthly_hotspots
+
+
+# -- Keep the first-pass monthly fire sets for the second pass
+def cache_monthly_hotspots(year, monthly_hotspots):
+    # Stores a year's monthly sets in memory, or spills them to disk so only one year is held at a time.
+    # In resumable runs the .npz file is always written: it is the year's partition checkpoint.
+    # Returns the path of the .npz file (None if it was not written).
+    if monthly_hotspots is None or (hotspot_cache_in_memory and not runner.enabled):
+        monthly_hotspot_cache[year] = monthly_hotspots
         return None
 
-    result = processing.run("native:clip", {
-        'INPUT': temp_layer,  # Layer with filtered features
-        'OVERLAY': bc_boundary_layer_3347,  # Clip layer (BC boundary)
-        'OUTPUT': 'memory:'  # Store result in memory (not saved to file)
+    os.makedirs(hotspot_cache_dir, exist_ok=True)
+    cache_path = os.path.join(hotspot_cache_dir, f"{year}_monthly_hotspots.npz")
+    np.savez_compressed(cache_path, **{
+        f"{month_num}_{name}": values
+        for month_num, month in monthly_hotspots.items() for name, values in month.items()
     })
-    clipped_layer = result['OUTPUT']
+    monthly_hotspot_cache[year] = monthly_hotspots if hotspot_cache_in_memory else cache_path
+    return cache_path
 
-    # If the clipped layer is empty, log a warning
-    if clipped_layer.featureCount() == 0:
-        logging.info(f"⚠️ {month_name} {year}: Clipped layer has no features.")
+
+def load_monthly_hotspots(year):
+    # Returns the year's monthly sets cached by the first pass (None if the year had no readable hotspots)
+    cached = monthly_hotspot_cache.get(year)
+    if not isinstance(cached, str):
+        return cached
+
+    monthly_hotspots = {month_num: {} for month_num in range(1, 13)}
+    with np.load(cached) as arrays:
+        for key in arrays.files:
+            month_num, name = key.split('_', 1)
+            monthly_hotspots[int(month_num)][name] = arrays[key]
+    return monthly_hotspots
+
+
+def get_monthly_hotspot_data(month_num, month_name, year, monthly_hotspots):
+    # Returns the fire points of one month from the year's partition (already filtered to the month and clipped to BC)
+    month = monthly_hotspots.get(month_num) if monthly_hotspots else None
+    if month is None or len(month['x']) == 0:
+        logging.info(f"⚠️ {month_name} {year}: No features matched the date.")
         return None
 
-    # Final preparations for the output layer
-    clipped_layer.setName(f"Hotspots {month_name} {year} EPSG:3347")
-    clipped_layer.updateExtents()
+    fire_points = make_point_table(month['x'], month['y'], month['lat'], month['lon'], month_name, year, fire=1)
+    logging.info(f"✅ {month_name} {year}: {point_table_length(fire_points)} fire points.")
+    return fire_points
+
 
-    logging.info(f"✅ {month_name} {year}: Final layer has {clipped_layer.featureCount()} features.")
-    return clipped_layer  # Return the final filtered and clipped hotspot layer
+# -- Show a point table in QGIS
+def point_table_to_layer(table, layer_name):
+    # Materialises a point table as a QGIS memory layer (only done on request, as it copies every point)
+    from qgis.PyQt.QtCore import QVariant  # Used for defining attribute data types
+    from qgis.core import QgsVectorLayer, QgsField, QgsFeature, QgsGeometry, QgsPointXY
+
+    layer = QgsVectorLayer("Point?crs=EPSG:3347", layer_name, "memory")
+    provider = layer.dataProvider()
+    attributes = [name for name in table if name not in ('x', 'y')]
+    field_types = {np.dtype('int32'): QVariant.Int, np.dtype('int64'): QVariant.Int, np.dtype('float64'): QVariant.Double}
+    provider.addAttributes([QgsField(name, field_types.get(table[name].dtype, QVariant.String)) for name in attributes])
+    layer.updateFields()
+
+    columns = [table[name].tolist() for name in attributes]
+    features = []
+    for i, (x, y) in enumerate(zip(table['x'].tolist(), table['y'].tolist())):
+        feat = QgsFeature()
+        feat.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+        feat.setAttributes([column[i] for column in columns])
+        features.append(feat)
+    provider.addFeatures(features)
+    layer.updateExtents()
+    return layer
 
 
 # Get climate data
@@ -349,14 +445,14 @@ def get_climate_raster_path(year, month_name):
         f"climate_data/GRIB_climate_data/{year}/{month_name}/Filled_Bands_{month_name}_{year}"
     )
 
-    # Step 2: Define the filename of the stacked climate raster
+    # Step 2: Define the filename of the stacked climate raster (as written by Climate_extraction_loop.py)
     # This file combines several climate variables into one multi-layer raster.
-    climate_stack = os.path.join(band_folder, f"{month_name}_{year}_Filled_Stacked_Climate.tif")
+    climate_stack = os.path.join(band_folder, 'Filled_Stacked_Climate.tif')
 
     # Step 3: Check if the raster file exists. If not, log an error and return None.
     if not os.path.exists(climate_stack):
         logging.info(f"❌ Missing climate raster: {climate_stack}")
-        return None, None
+        return None
 
     # Step 4: If the file exists, return the path to it.
     return climate_stack
@@ -364,8 +460,331 @@ def get_climate_raster_path(year, month_name):
 
 
 
+# -- Bulk point-in-BC test
+# A point in little-endian WKB: byte order, geometry type, x, y (21 bytes, no padding)
+WKB_POINT = np.dtype([('order', 'u1'), ('type', '<u4'), ('x', '<f8'), ('y', '<f8')])
+
+
+def points_inside_bc(xs, ys):
+    """
+    Keeps the points that fall inside the BC boundary. The whole batch is packed into one
+    MultiPoint and intersected with the BC polygon in a single GEOS call (which indexes the
+    polygon's edges once), instead of one contains() test per point.
+
+    Returns:
+    - (np.ndarray, np.ndarray): x and y (EPSG:3347) of the points inside BC.
+    """
+    points = np.empty(len(xs), dtype=WKB_POINT)
+    points['order'] = 1  # Little-endian
+    points['type'] = ogr.wkbPoint
+    points['x'] = xs
+    points['y'] = ys
+    multipoint = ogr.CreateGeometryFromWkb(struct.pack('<BII', 1, ogr.wkbMultiPoint, len(xs)) + points.tobytes())
+
+    inside = bc_geometry.Intersection(multipoint)
+    if inside is None or inside.IsEmpty():
+        return np.empty(0), np.empty(0)
+
+    if ogr.GT_Flatten(inside.GetGeometryType()) == ogr.wkbPoint:
+        return np.array([inside.GetX()]), np.array([inside.GetY()])
+    if ogr.GT_Flatten(inside.GetGeometryType()) == ogr.wkbMultiPoint and not inside.Is3D():
+        wkb = inside.ExportToWkb(ogr.wkbNDR)
+        kept = np.frombuffer(wkb, dtype=WKB_POINT, offset=9, count=inside.GetGeometryCount())
+        return kept['x'].copy(), kept['y'].copy()
+
+    # Any other result type: read the points one by one
+    kept = [inside.GetGeometryRef(i) for i in range(inside.GetGeometryCount())]
+    return np.array([g.GetX() for g in kept]), np.array([g.GetY() for g in kept])
+
+
+# -- Draw random points inside BC
+def sample_points_in_bc(count, batch_size=50000):
+    """
+    Draws exactly count uniformly distributed points inside BC by rejection sampling:
+    candidates are drawn over the boundary's bounding box in NumPy blocks and tested in bulk.
+    Block sizes follow the share of the bounding box covered by BC, so most counts need one or two blocks.
+
+    Returns:
+    - (np.ndarray, np.ndarray): x and y (EPSG:3347) of the points.
+    """
+    xmin, xmax, ymin, ymax = bc_geometry.GetEnvelope()
+    acceptance = bc_geometry.GetArea() / ((xmax - xmin) * (ymax - ymin))
+
+    xs, ys = [], []
+    remaining = count
+    while remaining > 0:
+        n_candidates = min(batch_size, int(remaining / acceptance * 1.1) + 100)
+        candidate_x, candidate_y = rng.uniform(xmin, xmax, n_candidates), rng.uniform(ymin, ymax, n_candidates)
+        inside = np.flatnonzero(bc_contains(candidate_x, candidate_y))[:remaining]
+        xs.append(candidate_x[inside])
+        ys.append(candidate_y[inside])
+        remaining -= len(inside)
+
+    return np.concatenate(xs) if xs else np.empty(0), np.concatenate(ys) if ys else np.empty(0)
+
+
+def bc_contains_exact(xs, ys):
+    # Same bulk test as points_inside_bc(), returned as a True/False value for every input point
+    inside_x, inside_y = points_inside_bc(xs, ys)
+    return np.isin(np.asarray(xs) + 1j * np.asarray(ys), inside_x + 1j * inside_y)
+
+
+# -- Rasterized BC membership
+MASK_OUTSIDE, MASK_INSIDE, MASK_BOUNDARY = 0, 1, 2
+bc_mask = None  # Membership raster and its grid, loaded on first use
+
+
+def build_bc_mask(resolution):
+    """
+    Rasterizes the BC boundary over its bounding box. Cells touched by the boundary line are
+    marked MASK_BOUNDARY; every other cell lies entirely inside or outside BC, which its
+    centre tells apart.
+
+    Returns:
+    - (np.ndarray, tuple): uint8 cell codes and the raster's geotransform.
+    """
+    xmin, xmax, ymin, ymax = bc_geometry.GetEnvelope()
+    n_cols = int(math.ceil((xmax - xmin) / resolution))
+    n_rows = int(math.ceil((ymax - ymin) / resolution))
+    geotransform = (xmin, resolution, 0, ymax, 0, -resolution)
+
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(3347)
+    mem_ds = ogr.GetDriverByName('Memory').CreateDataSource('bc_mask')
+    layers = []
+    for name, geom in (('area', bc_geometry), ('boundary', bc_geometry.GetBoundary())):
+        layer = mem_ds.CreateLayer(name, srs=srs, geom_type=geom.GetGeometryType())
+        feature = ogr.Feature(layer.GetLayerDefn())
+        feature.SetGeometry(geom)
+        layer.CreateFeature(feature)
+        layers.append(layer)
+
+    mask_ds = gdal.GetDriverByName('MEM').Create('', n_cols, n_rows, 1, gdal.GDT_Byte)
+    mask_ds.SetGeoTransform(geotransform)
+    mask_ds.SetProjection(srs.ExportToWkt())
+    gdal.RasterizeLayer(mask_ds, [1], layers[0], burn_values=[MASK_INSIDE])
+    gdal.RasterizeLayer(mask_ds, [1], layers[1], burn_values=[MASK_BOUNDARY], options=['ALL_TOUCHED=TRUE'])
+    codes = mask_ds.ReadAsArray()
+    mask_ds = None
+    mem_ds = None
+    return codes, geotransform
+
+
+def get_bc_mask():
+    """
+    Returns the BC membership raster, computed once and cached next to the reprojected BC boundary
+    (one file per bc_mask_resolution).
+    """
+    global bc_mask
+    if bc_mask is None:
+        cache_path = os.path.join(os.path.dirname(reprojected_bc_boundary), f'BC_boundary_mask_{bc_mask_resolution}m.npz')
+        if os.path.exists(cache_path):
+            with np.load(cache_path) as cached:
+                codes, geotransform = cached['codes'], tuple(cached['geotransform'])
+        else:
+            codes, geotransform = build_bc_mask(bc_mask_resolution)
+            np.savez_compressed(cache_path, codes=codes, geotransform=np.array(geotransform))
+            boundary_share = (codes == MASK_BOUNDARY).mean()
+            logging.info(f"✅ BC membership raster saved ({boundary_share:.2%} boundary cells): {cache_path}")
+        bc_mask = (codes, geotransform)
+    return bc_mask
+
+
+def bc_contains(xs, ys):
+    """
+    Tells which points are inside BC. Most points are settled by one array lookup in the
+    membership raster; only the points in cells the boundary passes through get the exact
+    polygon test.
+
+    Returns:
+    - np.ndarray: True for every point inside BC.
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    codes, (x0, dx, _, y0, _, dy) = get_bc_mask()
+
+    cols = np.floor((xs - x0) / dx).astype(np.int64)
+    rows = np.floor((ys - y0) / dy).astype(np.int64)
+    on_grid = (cols >= 0) & (cols < codes.shape[1]) & (rows >= 0) & (rows < codes.shape[0])
+
+    point_codes = np.full(xs.shape, MASK_OUTSIDE, dtype=np.uint8)
+    point_codes[on_grid] = codes[rows[on_grid], cols[on_grid]]
+
+    inside = point_codes == MASK_INSIDE
+    boundary = np.flatnonzero(point_codes == MASK_BOUNDARY)
+    if boundary.size:
+        inside[boundary] = bc_contains_exact(xs[boundary], ys[boundary])
+    return inside
+
+
+# -- Triangulate the BC boundary
+def bc_boundary_segments():
+    # Every edge of every ring (outer boundaries, lakes and islands) of the BC polygon, as (n, 2, 2) coordinates
+    polygons = [bc_geometry] if ogr.GT_Flatten(bc_geometry.GetGeometryType()) == ogr.wkbPolygon else \
+        [bc_geometry.GetGeometryRef(i) for i in range(bc_geometry.GetGeometryCount())]
+    segments = []
+    for polygon in polygons:
+        for r in range(polygon.GetGeometryCount()):
+            ring = np.array(polygon.GetGeometryRef(r).GetPoints())[:, :2]
+            segments.append(np.stack([ring[:-1], ring[1:]], axis=1))
+    segments = np.concatenate(segments)
+    return segments[(segments[:, 0] != segments[:, 1]).any(axis=1)]  # Drop repeated vertices
+
+
+def triangulate_bc(max_rounds=50):
+    """
+    Splits the BC polygon into triangles. A Delaunay triangulation of the boundary vertices
+    is refined by splitting every boundary edge it does not contain at its midpoint, until all
+    boundary edges are triangle edges. No triangle then straddles the boundary, so the
+    triangles whose centroid is inside BC cover the province exactly.
+
+    Returns:
+    - (np.ndarray, bool): (triangles, 3, 2) corner coordinates in EPSG:3347, and whether the refinement
+      converged. If it did not, some triangles still cross the boundary and points drawn in them must be checked.
+    """
+    segments = bc_boundary_segments()
+
+    for _ in range(max_rounds):
+        # Index the unique vertices, and the two ends of every boundary segment
+        vertices, ends = np.unique(segments.reshape(-1, 2), axis=0, return_inverse=True)
+        ends = ends.reshape(-1, 2)
+        triangulation = Delaunay(vertices)
+
+        # Boundary segments that are not an edge of any triangle
+        simplices = np.sort(triangulation.simplices, axis=1)
+        edges = np.concatenate([simplices[:, [0, 1]], simplices[:, [1, 2]], simplices[:, [0, 2]]])
+        n = len(vertices)
+        ends = np.sort(ends, axis=1)
+        missing = ~np.isin(ends[:, 0] * n + ends[:, 1], edges[:, 0] * n + edges[:, 1])
+        if not missing.any():
+            exact = True
+            break
+
+        # Split them at their midpoints and triangulate again
+        split = segments[missing]
+        midpoints = split.mean(axis=1)
+        segments = np.concatenate([
+            segments[~missing],
+            np.stack([split[:, 0], midpoints], axis=1),
+            np.stack([midpoints, split[:, 1]], axis=1)
+        ])
+    else:
+        exact = False
+        logging.info(f"⚠️ {int(missing.sum())} BC boundary edges are still cut by triangles after {max_rounds} rounds. "
+                     f"Points drawn from the triangles will be checked against the boundary.")
+
+    triangles = vertices[triangulation.simplices]
+    centroids = triangles.mean(axis=1)
+    return triangles[bc_contains(centroids[:, 0], centroids[:, 1])], exact
+
+
+bc_triangles = None  # Triangles, cumulative area weights and whether they cover BC exactly, loaded on first use
+
+
+def get_bc_triangles():
+    """
+    Returns the BC triangles, their cumulative area shares and whether they cover BC exactly. They are
+    computed once and cached next to the reprojected BC boundary, whose folder is named after the boundary's inputs.
+    """
+    global bc_triangles
+    if bc_triangles is None:
+        cache_path = os.path.join(os.path.dirname(reprojected_bc_boundary), 'BC_boundary_triangles.npz')
+        if os.path.exists(cache_path):
+            with np.load(cache_path) as cached:
+                triangles, cumulative_area = cached['triangles'], cached['cumulative_area']
+                exact = bool(cached['exact']) if 'exact' in cached.files else False  # Older caches are checked to be safe
+        else:
+            triangles, exact = triangulate_bc()
+            a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+            areas = 0.5 * np.abs((b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (c[:, 0] - a[:, 0]) * (b[:, 1] - a[:, 1]))
+            cumulative_area = np.cumsum(areas) / areas.sum()
+            np.savez(cache_path, triangles=triangles, cumulative_area=cumulative_area, exact=exact)
+            logging.info(f"✅ Triangulated the BC boundary into {len(triangles)} triangles: {cache_path}")
+        bc_triangles = (triangles, cumulative_area, exact)
+    return bc_triangles
+
+
+# -- Draw area-uniform points inside BC
+def sample_points_in_bc_triangles(count):
+    """
+    Draws exactly count uniformly distributed points inside BC with no rejection: each point
+    picks a triangle with probability proportional to its area, then a uniform position inside it.
+    The cost is linear in count, whatever the length of the coastline. If the triangulation did not
+    converge, points that fall outside BC are dropped and replaced by new draws.
+
+    Returns:
+    - (np.ndarray, np.ndarray): x and y (EPSG:3347) of the points.
+    """
+    triangles, cumulative_area, exact = get_bc_triangles()
+    if exact:
+        return draw_points_in_triangles(triangles, cumulative_area, count)
+
+    xs, ys = [np.empty(0)], [np.empty(0)]
+    remaining = count
+    while remaining > 0:
+        candidate_x, candidate_y = draw_points_in_triangles(triangles, cumulative_area, int(remaining * 1.05) + 100)
+        kept = np.flatnonzero(bc_contains(candidate_x, candidate_y))[:remaining]
+        xs.append(candidate_x[kept])
+        ys.append(candidate_y[kept])
+        remaining -= len(kept)
+    return np.concatenate(xs), np.concatenate(ys)
+
+
+def draw_points_in_triangles(triangles, cumulative_area, count):
+    # Picks a triangle per point with probability proportional to its area, then a uniform position inside it
+    picked = triangles[np.minimum(np.searchsorted(cumulative_area, rng.random(count)), len(triangles) - 1)]
+
+    # Uniform barycentric coordinates (points past the diagonal are folded back into the triangle)
+    r1, r2 = rng.random(count), rng.random(count)
+    folded = r1 + r2 > 1
+    r1[folded], r2[folded] = 1 - r1[folded], 1 - r2[folded]
+    points = picked[:, 0] + r1[:, None] * (picked[:, 1] - picked[:, 0]) + r2[:, None] * (picked[:, 2] - picked[:, 0])
+    return points[:, 0], points[:, 1]
+
+
+# -- Draw non-fire points away from the month's fires
+def sample_non_fire_points(count, fire_xy=None, exclusion_distance=0, max_rounds=100):
+    """
+    Draws count random points inside BC with the configured sampler. With an exclusion distance,
+    candidates within that distance of any fire point are rejected and more are drawn. The fire
+    points go into a KD-tree once per month, so each block of candidates is checked with one
+    bulk nearest-neighbour query instead of pairwise distances.
+
+    Returns:
+    - (np.ndarray, np.ndarray): x and y (EPSG:3347) of the points.
+    """
+    sampler = sample_points_in_bc_triangles if non_fire_sampler == 'triangulation' else sample_points_in_bc
+    if fire_xy is None or len(fire_xy) == 0 or exclusion_distance <= 0:
+        return sampler(count)
+
+    fire_tree = cKDTree(fire_xy)
+    xs, ys = [], []
+    remaining = count
+    acceptance = 1.0  # Share of candidates kept so far, used to size the next block
+    for _ in range(max_rounds):
+        n_candidates = int(remaining / max(acceptance, 0.01) * 1.1) + 100
+        candidate_x, candidate_y = sampler(n_candidates)
+
+        # Distance to the nearest fire point, infinite when none is within the exclusion distance
+        distance, _ = fire_tree.query(np.column_stack([candidate_x, candidate_y]), k=1,
+                                      distance_upper_bound=exclusion_distance)
+        kept = np.flatnonzero(np.isinf(distance))
+        acceptance = len(kept) / n_candidates
+
+        kept = kept[:remaining]
+        xs.append(candidate_x[kept])
+        ys.append(candidate_y[kept])
+        remaining -= len(kept)
+        if remaining == 0:
+            break
+    else:
+        logging.info(f"⚠️ Only found {count - remaining} of {count} points farther than {exclusion_distance} m from a fire.")
+
+    return np.concatenate(xs), np.concatenate(ys)
+
+
 # -- Generate random non-fire points
-def gen_non_fire_points(year, month_name, non_fire_count):
+def gen_non_fire_points(year, month_name, non_fire_count, fire_xy=None):
     """
     Generates random non-fire points within the BC boundary.
 
@@ -373,532 +792,741 @@ def gen_non_fire_points(year, month_name, non_fire_count):
     - year (int): The year for which points are being generated.
     - month_name (str): Month name (e.g., 'January').
     - non_fire_count (int): Number of non-fire points to generate (either equal to fire count or 400).
+    - fire_xy (np.ndarray): (points, 2) EPSG:3347 coordinates of the month's fire points, kept at least
+      non_fire_exclusion_distance away from the non-fire points (None = no exclusion).
     
     Returns:
-    - QgsVectorLayer: The generated random points layer.
+    - dict: Point table of the generated non-fire points.
     """
 
-    # Create folder to store the generated shapefile
-    random_pts_dir = os.path.join(base_dir, f"Point_data/Random_points/{year}/{month_name}")
-    os.makedirs(random_pts_dir, exist_ok=True)
-
-    # Set the projection system to use: EPSG:3347 (a coordinate system suitable for Canada)
-    target_crs = QgsCoordinateReferenceSystem('EPSG:3347')
-
-    # Path where the shapefile with random points will be saved
-    output_path = os.path.join(random_pts_dir, f"Random_NoFire_{month_name}_{year}.shp")
-
-    # Check if the BC boundary layer is valid
-    if not bc_boundary_layer_3347.isValid():
-        logging.info("❌ BC boundary layer is not valid.")
+    # Check if the BC boundary was loaded
+    if bc_geometry is None:
+        logging.info("❌ BC boundary is not loaded.")
         return None
 
-    # Get the extent (bounding box) of the BC boundary layer to know the area to generate points in
-    extent = bc_boundary_layer_3347.extent()
-    xmin, xmax, ymin, ymax = extent.xMinimum(), extent.xMaximum(), extent.yMinimum(), extent.yMaximum()
+    # Randomly generate exactly the desired number of points inside BC
+    xs, ys = sample_non_fire_points(non_fire_count, fire_xy, non_fire_exclusion_distance)
 
-    # Prepare a coordinate transformer to convert coordinates into latitude/longitude (EPSG:4326)
-    transformer = Transformer.from_crs("EPSG:3347", "EPSG:4326", always_xy=True)
+    # Convert coordinates to lat/lon for the attribute table (all points at once)
+    lats, lons = to_wgs84(xs, ys)
 
-    # Create a memory layer to store the randomly generated non-fire points
-    layer = QgsVectorLayer(f"Point?crs={target_crs.authid()}", f"Random_NoFire_{month_name}_{year}", "memory")
-    provider = layer.dataProvider()
+    non_fire_points = make_point_table(xs, ys, lats, lons, month_name, year, fire=0)  # Fire = 0 (non-fire)
+    logging.info(f"✅ Successfully generated {len(xs)} no-fire points for {month_name} {year}.")
 
-    # Define the attribute fields for each random point
-    common_fields = [
-        QgsField("Latitude", QVariant.Double),
-        QgsField("Longitude", QVariant.Double),
-        QgsField("Month", QVariant.String),
-        QgsField("Year", QVariant.Int),
-        QgsField("Fire", QVariant.Int)
-    ]
-    provider.addAttributes(common_fields)
-    layer.updateFields()
+    # Save the points as a shapefile to disk (debug artifact level only)
+    if keep_intermediates():
+        random_pts_dir = os.path.join(base_dir, f"Point_data/Random_points/{year}/{month_name}")
+        os.makedirs(random_pts_dir, exist_ok=True)
+        output_path = os.path.join(random_pts_dir, f"Random_NoFire_{month_name}_{year}.shp")
+        if write_point_table(non_fire_points, output_path):
+            logging.info(f"✅ Random no-fire layer saved: {output_path}")
 
-    # Randomly generate points within the extent until the desired number is reached
-    features = []
-    tries = 0
-    max_tries = 10000  # Prevent infinite loops if the area is too small
-
-    while len(features) < non_fire_count and tries < max_tries:
-        # Generate a random x and y coordinate within the extent
-        x = random.uniform(xmin, xmax)
-        y = random.uniform(ymin, ymax)
-        point = QgsPointXY(x, y)
-        geom = QgsGeometry.fromPointXY(point)
-
-        # Use a spatial index to check if the point falls inside BC's actual polygon shape
-        ids = spatial_index.intersects(geom.boundingBox())
-        if any(boundary_features[i].geometry().contains(geom) for i in ids):
-            # Convert coordinates to lat/lon for the attribute table
-            lon, lat = transformer.transform(x, y)
-            feat = QgsFeature()
-            feat.setGeometry(geom)
-            feat.setAttributes([lat, lon, month_name, year, 0])  # Fire = 0 (non-fire)
-            features.append(feat)
-        tries += 1
-
-    # Add the generated features to the memory layer
-    provider.addFeatures(features)
-    layer.updateExtents()
+    return non_fire_points
 
-    # Log how many points were successfully generated
-    if len(features) < non_fire_count:
-        logging.info(f"⚠️ Only generated {len(features)} of {non_fire_count} points after {max_tries} attempts.")
-    else:
-        logging.info(f"✅ Successfully generated {non_fire_count} no-fire points for {month_name} {year}.")
 
-    # Save the layer as a shapefile to disk
-    QgsVectorFileWriter.writeAsVectorFormat(layer, output_path, "UTF-8", target_crs, "ESRI Shapefile")
-    logging.info(f"✅ Random no-fire layer saved: {output_path}")
+# -- MERGE fire and non-fire data points
+def merge_data_points(month_name, year, fire_points, non_fire_points):
+    # Fire points first, then non-fire
+    merged_points = concat_point_tables(fire_points, non_fire_points)
+
+    # At the debug artifact level, save the merged points as a shapefile and log whether it was written
+    if keep_intermediates():
+        merged_output_folder = os.path.join(base_dir, f"Point_data/Merged/{year}/{month_name}")
+        os.makedirs(merged_output_folder, exist_ok=True)
+        merged_path = os.path.join(merged_output_folder, f"Merged_Fire_NoFire_{month_name}_{year}.shp")
+        if write_point_table(merged_points, merged_path):
+            logging.info(f"✅ Merged dataset saved to: {merged_path}")
+        else:
+            logging.info("❌ Failed to write merged shapefile.")
 
-    return layer, common_fields, transformer, target_crs
+    return merged_points
 
 
-# === Clean hotspot layer
-def rebuild_hotspot_clean_copy(clipped_layer, common_fields):
+# -- Sample a lat/lon climate stack at point locations
+def sample_climate_native(climate_stack, lats, lons, method='nearest'):
+    """
+    Samples a climate stack that is still on its native regular lat/lon grid (ERA5, 0.25°).
+    Only the points are in geographic coordinates; grid indices are computed arithmetically
+    from the raster's geotransform, so the climate raster never needs to be warped.
+
+    Parameters:
+    - climate_stack (str): Path to the filled climate stack.
+    - lats, lons (array-like): Point latitudes and longitudes (EPSG:4326).
+    - method (str): 'nearest' for the containing cell, or 'bilinear' between the 4 surrounding cell centres.
 
-    # If there's no input layer, exit early
-    if clipped_layer is None:
-        logging.info("ℹ️ No fire points to clean.")
+    Returns:
+    - np.ndarray: (points, bands) values, with NaN for points outside the grid or on NoData cells.
+      None if the stack is not on a geographic grid.
+    """
+    ds = gdal.Open(climate_stack)
+    if ds is None:
+        logging.error(f"❌ Could not open climate raster: {climate_stack}")
         return None
 
-    # If the layer is invalid (corrupt or empty), exit early
-    if not clipped_layer.isValid():
-        logging.info("❌ Hotspot layer is not valid.")
+    srs = osr.SpatialReference(wkt=ds.GetProjection())
+    if not srs.IsGeographic():
+        logging.error(f"❌ Climate raster is not on a lat/lon grid: {climate_stack}")
         return None
 
-    logging.info("🔁 Creating clean memory copy...")
+    stack = ds.ReadAsArray().astype(np.float64)
+    if stack.ndim == 2:  # A single-band raster is returned as (y, x)
+        stack = stack[np.newaxis, :, :]
+    nodata = ds.GetRasterBand(1).GetNoDataValue()
+    x0, dx, _, y0, _, dy = ds.GetGeoTransform()
+    ds = None
 
-    # Create a new memory layer to store the cleaned fire points
-    cleaned_layer = QgsVectorLayer(f"Point?crs={clipped_layer.crs().authid()}", "Cleaned_Hotspot", "memory")
-    provider = cleaned_layer.dataProvider()
-    provider.addAttributes(common_fields)
-    cleaned_layer.updateFields()
+    if nodata is not None:
+        stack[stack == nodata] = np.nan
+    n_bands, n_rows, n_cols = stack.shape
 
-    # Determine actual field names for date and coordinates (could vary)
-    original_fields = clipped_layer.fields().names()
-    lat_name = 'LAT' if 'LAT' in original_fields else 'lat'
-    lon_name = 'LON' if 'LON' in original_fields else 'lon'
-    date_name = 'REP_DATE' if 'REP_DATE' in original_fields else 'rep_date'
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    lons = np.where(lons < x0, lons + 360.0, lons)  # Grids stored as 0–360° longitudes
 
-    # Loop through features (fire points) and extract clean, consistent attributes
-    for feat in clipped_layer.getFeatures():
-        try:
-            rep_date = feat[date_name]
-            if "/" in rep_date:
-                dt = datetime.strptime(rep_date, "%Y/%m/%d %H:%M:%S.%f")
-            else:
-                dt = datetime.strptime(rep_date, "%Y-%m-%d %H:%M:%S")
-            month = dt.strftime('%B')
-            year = dt.year
-        except Exception as e:
-            logging.info(f"⚠️ Failed date parsing for feature ID {feat.id()}: {e}")
-            month, year = '', 0
+    # Fractional column/row positions, measured from the grid's outer edge
+    col_f = (lons - x0) / dx
+    row_f = (lats - y0) / dy
+    inside = (col_f >= 0) & (col_f < n_cols) & (row_f >= 0) & (row_f < n_rows)
 
-        lat = feat[lat_name]
-        lon = feat[lon_name]
+    values = np.full((lats.size, n_bands), np.nan)
 
-        new_feat = QgsFeature()
-        new_feat.setGeometry(feat.geometry())
-        new_feat.setAttributes([lat, lon, month, year, 1])  # Fire = 1
-        provider.addFeature(new_feat)
+    # Nearest: the cell that contains the point
+    cols = np.clip(np.floor(col_f).astype(np.int64), 0, n_cols - 1)
+    rows = np.clip(np.floor(row_f).astype(np.int64), 0, n_rows - 1)
+    values[inside] = stack[:, rows[inside], cols[inside]].T
 
-    cleaned_layer.updateExtents()
-    logging.info("✅ Cleaned hotspot layer built and loaded.")
-    return cleaned_layer
+    if method == 'bilinear':
+        # Interpolate between the 4 surrounding cell centres (clamped at the grid edge)
+        fx = np.clip(col_f - 0.5, 0, n_cols - 1)
+        fy = np.clip(row_f - 0.5, 0, n_rows - 1)
+        c0 = np.floor(fx).astype(np.int64)
+        r0 = np.floor(fy).astype(np.int64)
+        c1 = np.minimum(c0 + 1, n_cols - 1)
+        r1 = np.minimum(r0 + 1, n_rows - 1)
+        wx = fx - c0
+        wy = fy - r0
 
+        bilinear = (
+            stack[:, r0, c0] * ((1 - wx) * (1 - wy)) +
+            stack[:, r0, c1] * (wx * (1 - wy)) +
+            stack[:, r1, c0] * ((1 - wx) * wy) +
+            stack[:, r1, c1] * (wx * wy)
+        ).T
 
-def reorder_hotspots(cleaned_layer, layer, transformer, common_fields):
-    # If no cleaned fire layer is provided, exit early
-    if cleaned_layer is None:
-        logging.info("ℹ️ No fire points to reorder.")
-        return None
+        # Keep the nearest value where a NoData neighbour makes the interpolation undefined
+        use_bilinear = inside[:, np.newaxis] & ~np.isnan(bilinear)
+        values = np.where(use_bilinear, bilinear, values)
 
-    # Create a memory layer to store reordered hotspot points
-    reordered_hotspot = QgsVectorLayer(f'Point?crs={cleaned_layer.crs().authid()}', "Reordered_Hotspot", "memory")
-    provider_hotspot = reordered_hotspot.dataProvider()
-    provider_hotspot.addAttributes(common_fields)
-    reordered_hotspot.updateFields()
-    
-    # Add fire points to this new layer
-    for feat in cleaned_layer.getFeatures():
-        f = QgsFeature()
-        f.setGeometry(feat.geometry())
-        f.setAttributes([
-            feat['Latitude'], feat['Longitude'], feat['Month'], feat['Year'], feat['Fire']
-        ])
-        provider_hotspot.addFeature(f)
-    
-    reordered_hotspot.updateExtents()
-    logging.info("✅ Reordered hotspot layer created.")
-
-    # Update coordinates for non-fire points by re-transforming geometry
-    with edit(layer):
-        lat_idx = layer.fields().indexOf("Latitude")
-        lon_idx = layer.fields().indexOf("Longitude")
-        for feature in layer.getFeatures():
-            geom = feature.geometry()
-            if geom and not geom.isMultipart():
-                x, y = geom.asPoint()
-                lon, lat = transformer.transform(x, y)
-                feature.setAttribute(lat_idx, lat)
-                feature.setAttribute(lon_idx, lon)
-                layer.updateFeature(feature)
-
-    logging.info("✅ Recalculated WGS84 coordinates for non-fire layer.")
-    return reordered_hotspot
+    return values
 
 
-# -- MERGE fire and non-fire data points
-def merge_data_points(month_name, year, month_num, reordered_hotspot, layer, common_fields, target_crs):
-    # Decide which coordinate system (CRS) to use — prefer the fire layer if available
-    base_crs = reordered_hotspot.crs().authid() if reordered_hotspot else layer.crs().authid()
-
-    # Create the folder where the merged output will be saved
-    merged_output_folder = os.path.join(base_dir, f"Point_data/Merged/{year}/{month_name}")
-    os.makedirs(merged_output_folder, exist_ok=True)
-
-    # Set the file path for the merged shapefile
-    merged_path = os.path.join(merged_output_folder, f"Merged_Fire_NoFire_{month_name}_{year}.shp")
-
-    # Create a temporary (in-memory) vector layer to store merged points
-    merged_layer = QgsVectorLayer(f'Point?crs={base_crs}', "Merged", "memory")
-    merged_provider = merged_layer.dataProvider()
-
-    # Define the structure of the attributes (columns)
-    merged_provider.addAttributes(common_fields)
-    merged_layer.updateFields()
-
-    # Add features from both the fire and non-fire layers to the merged layer
-    for src_layer in [reordered_hotspot, layer]:  # Fire points first, then non-fire
-        if src_layer is not None:
-            for feat in src_layer.getFeatures():
-                f = QgsFeature()
-                f.setGeometry(feat.geometry())  # Copy the geometry (coordinates)
-                f.setAttributes([  # Set the attribute values from the source feature
-                    feat['Latitude'], feat['Longitude'], feat['Month'], feat['Year'], feat['Fire']
-                ])
-                merged_provider.addFeature(f)
-
-    # Update the spatial boundaries of the merged layer
-    merged_layer.updateExtents()
-
-    # Save the in-memory merged layer as a physical shapefile to disk
-    QgsVectorFileWriter.writeAsVectorFormat(merged_layer, merged_path, "UTF-8", target_crs, "ESRI Shapefile")
-
-    # Log whether the shapefile was successfully written
-    if os.path.exists(merged_path):
-        logging.info(f"✅ Merged dataset saved to: {merged_path}")
-    else:
-        logging.info("❌ Failed to write merged shapefile.")
-    
-    return merged_layer
+# -- Rasters held in memory for point sampling
+raster_arrays = {}  # path -> raster values and grid, read once per run
 
 
-# -- Rename automatically assigned raster band fields to readable names
-def rename_climate_fields(layer, rename_map):
+def load_raster_array(raster_path):
     """
-    Takes a vector layer that contains raster sampling results and renames
-    generic band names (e.g., Band_1) to descriptive names (e.g., temperature).
+    Reads a raster into memory once and keeps it for the rest of the run.
+
+    Returns:
+    - dict: 'data' (bands, y, x) array, 'geotransform', 'nodata' and 'geographic'. None if the raster cannot be opened.
     """
-    
-    # Start editing the layer if it's not already editable
-    if not layer.isEditable():
-        layer.startEditing()
-
-    # Get the list of existing field names
-    fields = layer.fields()
-
-    # Loop through each rename mapping (e.g., Band_1 ➝ temp_2m)
-    for old_name, new_name in rename_map.items():
-        idx = fields.indexOf(old_name)  # Get the index of the old name
-        if idx != -1:
-            logging.info(f"🔤 Renaming {old_name} ➜ {new_name}")
-            layer.renameAttribute(idx, new_name)
+    if raster_path not in raster_arrays:
+        raster = read_raster_array(raster_path)
+        if raster is None:
+            logging.error(f"❌ Could not open raster: {raster_path}")
+            return None
+        raster_arrays[raster_path] = raster
+    return raster_arrays[raster_path]
+
+
+# Names of the sampled columns, in climate stack band order, then the fuel type
+CLIMATE_FIELDS = ['u10_wind', 'v10_wind', 'dew_temp_2m', 'temp_2m', 'tot_precip', 'lai_high']
+FUEL_FIELD = 'Fuel_Type'
+FUEL_MISSING = -9999  # Fuel_Type of points outside the fuel raster or on its NoData cells
+
+
+# -- Fuel codes shared by all worker processes
+# The BC fuel raster is decoded once into a uint8 .npy file next to it. Every process opens it as a
+# read-only memory map, so the workers share the operating system's single cached copy of the codes.
+FUEL_GRID_NODATA = 255  # uint8 code of the fuel grid's NoData cells
+fuel_grid = None  # Memory-mapped fuel codes and their grid, opened on first use in each process
+
+
+def build_fuel_grid(raster_path, grid_path, metadata_path, strip_rows=2048):
+    """
+    Decodes the fuel raster strip by strip into a uint8 .npy file, with NoData stored as FUEL_GRID_NODATA.
+    The file is written under a temporary name and renamed, so workers never open a half-written grid.
+
+    Returns:
+    - bool: True if the grid was written, False if the raster cannot be read or has codes outside 0–254.
+    """
+    ds = gdal.Open(raster_path)
+    if ds is None:
+        logging.error(f"❌ Could not open raster: {raster_path}")
+        return False
+    band = ds.GetRasterBand(1)
+    nodata = band.GetNoDataValue()
+    n_rows, n_cols = ds.RasterYSize, ds.RasterXSize
+
+    tmp_path = grid_path + '.tmp'
+    codes = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8, shape=(n_rows, n_cols))
+    for y in range(0, n_rows, strip_rows):
+        strip = band.ReadAsArray(0, y, n_cols, min(strip_rows, n_rows - y))
+        missing = strip == nodata if nodata is not None else np.zeros(strip.shape, dtype=bool)
+        valid = strip[~missing]
+        if valid.size and (valid.min() < 0 or valid.max() >= FUEL_GRID_NODATA):
+            logging.info(f"⚠️ Fuel codes outside 0–{FUEL_GRID_NODATA - 1} in {raster_path}. Not using a uint8 fuel grid.")
+            del codes
+            os.remove(tmp_path)
+            return False
+        codes[y:y + strip.shape[0]] = np.where(missing, FUEL_GRID_NODATA, strip)
+    codes.flush()
+    del codes
+
+    with open(metadata_path, 'w') as f:
+        json.dump({'geotransform': list(ds.GetGeoTransform()), 'nodata': FUEL_GRID_NODATA}, f, indent=2)
+    ds = None
+    os.replace(tmp_path, grid_path)
+    logging.info(f"✅ Fuel grid of {n_rows} × {n_cols} uint8 codes saved: {grid_path}")
+    return True
+
+
+def get_fuel_grid():
+    """
+    Opens the uint8 fuel grid as a read-only memory map. Only the main process builds it first if it does
+    not exist yet; worker processes never write it, so they cannot race each other on the temporary file.
+
+    Returns:
+    - dict: 'data' (y, x) memory map and 'geotransform'. None if the codes do not fit in uint8.
+    """
+    global fuel_grid
+    if fuel_grid is None:
+        grid_path = os.path.splitext(final_clipped_raster)[0] + '_codes.npy'
+        metadata_path = os.path.splitext(final_clipped_raster)[0] + '_codes.json'
+        if not (os.path.exists(grid_path) and os.path.exists(metadata_path)):
+            if multiprocessing.parent_process() is not None or not build_fuel_grid(final_clipped_raster, grid_path, metadata_path):
+                fuel_grid = False  # Do not try again in this process
+                return None
+        with open(metadata_path, 'r') as f:
+            metadata = json.load(f)
+        fuel_grid = {'data': np.load(grid_path, mmap_mode='r'), 'geotransform': metadata['geotransform']}
+    return fuel_grid or None
+
+
+# -- Sample climate and fuel at point arrays
+def sample_points(xs, ys, lats, lons, year, month_num, climate_stack):
+    """
+    Samples the month's climate and the fuel type at every point, straight from in-memory arrays.
+
+    Parameters:
+    - xs, ys (array-like): Point coordinates in EPSG:3347.
+    - lats, lons (array-like): The same points in WGS84.
+    - climate_stack (str): Path to the month's filled climate stack (used when the datacube lacks the month).
+
+    Returns:
+    - dict: Typed columns: float64 climate columns (NaN where missing) and an int32 'Fuel_Type' column
+      (FUEL_MISSING where missing).
+    """
+    n_points = len(xs)
+
+    # === Climate: one read from the datacube, or a lookup in the month's stack in its own CRS ===
+    climate_values = None
+    if climate_sampling == 'datacube' and climate_cube is not None and datacube_month(climate_cube, year, month_num) is not None:
+        sample_xs, sample_ys = (lons, lats) if climate_cube['geographic'] else (xs, ys)
+        climate_values = sample_climate_datacube(
+            climate_cube, [year] * n_points, [month_num] * n_points, sample_xs, sample_ys
+        ).astype(np.float64)
+    elif climate_stack and os.path.exists(climate_stack):
+        ds = gdal.Open(climate_stack)
+        geographic = ds is not None and bool(osr.SpatialReference(wkt=ds.GetProjection()).IsGeographic())
+        ds = None
+        if geographic:
+            # ERA5 is a regular lat/lon grid, so the points are looked up by lat/lon (nearest or bilinear)
+            climate_values = sample_climate_native(climate_stack, lats, lons, method=climate_interpolation)
         else:
-            logging.info(f"⚠️ Field {old_name} not found in layer")
+            # Each monthly stack is only sampled once, so it is sampled by the backend rather than kept in memory
+            climate_values = backend.raster_sampling(climate_stack, xs, ys)
 
-    # Save the changes
-    layer.commitChanges()
+    if climate_values is None:
+        logging.info(f"⚠️ No climate data for {month_words[month_num]} {year}. Climate columns left empty.")
+        climate_values = np.full((n_points, len(CLIMATE_FIELDS)), np.nan)
 
+    table = {name: climate_values[:, i] for i, name in enumerate(CLIMATE_FIELDS)}
 
+    # === Fuel type: looked up in the shared uint8 fuel grid (or the fuel raster read into this process's memory) ===
+    grid = get_fuel_grid()
+    if grid is not None:
+        fuel_raster = {'data': grid['data'][np.newaxis], 'geotransform': grid['geotransform'], 'nodata': FUEL_GRID_NODATA}
+    else:
+        fuel_raster = load_raster_array(final_clipped_raster)
+    fuel_values = sample_raster_array(fuel_raster, xs, ys)[:, 0] if fuel_raster is not None else np.full(n_points, np.nan)
+    table[FUEL_FIELD] = np.where(np.isnan(fuel_values), FUEL_MISSING, fuel_values).astype(np.int32)
 
-# == POINT SAMPLING TIME!
-def point_sampling(month_name, year, merged_layer, climate_stack):
-    # === Output setup ===
-    # Create a folder path and output file name to store sampled point shapefile for the given month and year
-    sampled_output_folder = os.path.join(base_dir, f"Point_data/Sampled/{year}/{month_name}")
-    os.makedirs(sampled_output_folder, exist_ok=True)
-    sampled_output_path = os.path.join(sampled_output_folder, f"Sampled_Points_{month_name}{year}.shp")
-
-    # === Temporary paths ===
-    # Define temporary file paths to hold intermediate sampling results
-    temp_input_path = os.path.join(sampled_output_folder, "temp_input_points.shp")
-    temp_climate_sampled_path = os.path.join(sampled_output_folder, "temp_climate_sampled.shp")
-
-    # === Save input merged layer to shapefile ===
-    # Save the merged fire and non-fire point layer as a temporary shapefile so it can be sampled
-    QgsVectorFileWriter.writeAsVectorFormat(merged_layer, temp_input_path, "UTF-8", merged_layer.crs(), "ESRI Shapefile")
-
-    # === Load climate raster layer as QgsRasterLayer objects ===
-    # Load the multi-band climate raster (e.g., temperature, wind) for use in sampling
-    climate_raster = QgsRasterLayer(climate_stack, f"Climate Raster_{month_name}_{year}")
-    if not climate_raster.isValid():
-        logging.error(f"❌ Invalid climate raster: {climate_stack}")
-        return None, None, sampled_output_folder
-
-    # Ensure the fuel raster has been correctly loaded beforehand
-    if not reprojected_fuel_layer.isValid():
-        logging.error(f"❌ Invalid fuel raster: {fuel_raster_path}")
-        return None, None, sampled_output_folder
-
-    # === Sample climate stack ===
-    # Use the "Raster Sampling" tool to attach climate values (from each raster band) to the input points
-    processing.run("native:rastersampling", {
-        'INPUT': temp_input_path,            # Input points to sample
-        'RASTERCOPY': climate_raster,        # Raster to sample from
-        'COLUMN_PREFIX': '',                 # Leave output columns without a prefix
-        'OUTPUT': temp_climate_sampled_path  # Save output to temporary path
-    })
+    return table
 
-    # === Sample fuel raster ===
-    # Use the same sampling tool to attach fuel type data to each point
-    processing.run("native:rastersampling", {
-        'INPUT': temp_climate_sampled_path,    # Points that now have climate data
-        'RASTERCOPY': reprojected_fuel_layer,  # Raster with fuel types
-        'COLUMN_PREFIX': 'Fuel_',             # Prefix for fuel columns
-        'OUTPUT': sampled_output_path         # Final output shapefile with all attributes
-    })
 
-    logging.info(f"✅ Sampled points saved to: {sampled_output_path}")
-
-    # === Rename fields ===
-    # Load the sampled shapefile and rename its generic column names (e.g., '1', '2') to meaningful names
-    sampled_layer = QgsVectorLayer(sampled_output_path, "Sampled Points", "ogr")
-    if not sampled_layer.isValid():
-        logging.error(f"❌ Failed to load sampled layer: {sampled_output_path}")
-        return None, None, sampled_output_folder
-
-    # Mapping of original raster band names to user-friendly names
-    rename_map = {
-        '1': 'u10_wind',
-        '2': 'v10_wind',
-        '3': 'dew_temp_2m',
-        '4': 'temp_2m',
-        '5': 'tot_precip',
-        '6': 'lai_high',
-        'Fuel_1': 'Fuel_Type'
-    }
+# == POINT SAMPLING TIME!
+def point_sampling(month_name, year, merged_points, climate_stack):
+    # Ensure the fuel codes can be loaded (the shared fuel grid, or the fuel raster itself)
+    if get_fuel_grid() is None and load_raster_array(final_clipped_raster) is None:
+        logging.error(f"❌ Invalid fuel raster: {final_clipped_raster}")
+        return None
 
-    # Apply the renaming
-    rename_climate_fields(sampled_layer, rename_map)
+    # === Sample climate and fuel values at the points and add them as columns ===
+    month_num = {name: num for num, name in month_words.items()}[month_name]
+    sampled_points = dict(merged_points)
+    sampled_points.update(sample_points(
+        merged_points['x'], merged_points['y'], merged_points['Latitude'], merged_points['Longitude'],
+        year, month_num, climate_stack
+    ))
 
-    return sampled_layer, None, sampled_output_folder
+    logging.info(f"✅ Sampled climate and fuel values at {point_table_length(sampled_points)} points.")
+    return sampled_points
 
 
 # -- Clean missing values
-def clean_sampled_layer(sampled_layer):
-    """Removes features with missing climate or fuel data."""
-    
-    # Create a new in-memory vector layer with the same coordinate system as the input
-    crs = sampled_layer.crs().authid()
-    clean_layer = QgsVectorLayer(f"Point?crs={crs}", "Cleaned Sampled Points", "memory")
-    clean_provider = clean_layer.dataProvider()
-    
-    # Copy the same fields from the input layer
-    clean_provider.addAttributes(sampled_layer.fields())
-    clean_layer.updateFields()
-
-    # Fields to check for missing data
-    fields_to_check = [
-        'u10_wind', 'v10_wind', 'dew_temp_2m', 'temp_2m',
-        'tot_precip', 'lai_high', 'Fuel_Type'
-    ]
-
-    # Only keep fields that actually exist in the data (in case of mismatches)
-    valid_fields = [f.name() for f in sampled_layer.fields()]
-    fields_to_check = [f for f in fields_to_check if f in valid_fields]
-
-    removed = 0  # Track number of removed features
-
-    # Loop through all features in the layer and filter out incomplete ones
-    for feat in sampled_layer.getFeatures():
-        has_null = any(
-            feat[field] in [None, '', -9999] or
-            (isinstance(feat[field], float) and math.isnan(feat[field]))
-            for field in fields_to_check
+MISSING_VALUE = -9999  # Marker for missing values in sampled columns (as NaN is in float columns)
+
+
+def missing_mask(column):
+    # True where a column holds None, '', -9999 or NaN, checked on the whole column at once
+    if np.issubdtype(column.dtype, np.floating):
+        return np.isnan(column) | (column == MISSING_VALUE)
+    if np.issubdtype(column.dtype, np.number):
+        return column == MISSING_VALUE
+    as_text = column.astype(str)
+    return (as_text == '') | (as_text == 'None') | (as_text == 'nan') | (as_text == str(MISSING_VALUE))
+
+
+def clean_sampled_points(sampled_points):
+    """
+    Removes points with missing climate or fuel data in one boolean mask over the sampled columns,
+    and logs how many points each variable is missing (which shows the raster that caused the drops).
+
+    Returns:
+    - dict: Point table of the points with all values present.
+    """
+    # Fields to check for missing data (only those that exist in the table)
+    fields_to_check = [name for name in CLIMATE_FIELDS + [FUEL_FIELD] if name in sampled_points]
+
+    n_points = point_table_length(sampled_points)
+    missing = np.zeros(n_points, dtype=bool)
+    drop_counts = {}
+    for name in fields_to_check:
+        field_missing = missing_mask(sampled_points[name])
+        drop_counts[name] = int(field_missing.sum())
+        missing |= field_missing
+
+    clean_points = filter_point_table(sampled_points, ~missing)
+
+    logging.info(f"✅ Filtered out {int(missing.sum())} features with missing values.")
+    for name, count in drop_counts.items():
+        if count:
+            logging.info(f"   {name:<12} missing at {count} of {n_points} points")
+    logging.info(f"📦 Remaining features: {point_table_length(clean_points)}")
+    return clean_points
+
+
+# === Save the cleaned points ===
+def get_point_csv_path(year, month_name):
+    # Monthly CSV of the cleaned points (CSV output), combined into one CSV at the end of the run
+    return os.path.join(base_dir, f"Point_data/Sampled/{year}/{month_name}/Cleaned_Sampled_Points_{month_name}{year}.csv")
+
+
+def save_point_file(year, month_name, clean_points):
+    month_num = {name: num for num, name in month_words.items()}[month_name]
+
+    output_path = None
+    if artifact_level == 'none':
+        logging.info(f"ℹ️ {month_name} {year}: Cleaned points kept in memory only.")
+    elif output_format == 'parquet':
+        # Write the month as its Year/Month partition of the dataset, with typed columns
+        output_path = write_point_partition(
+            clean_points, points_dataset_dir, year, month_num,
+            float32_columns=CLIMATE_FIELDS, categorical_columns=[FUEL_FIELD]
         )
-        if has_null:
-            removed += 1
-            continue
+    else:
+        # Write the clean points to the month's CSV, with the point geometry as X,Y coordinates
+        # (the monthly CSVs are the checkpoints the combined CSV is rebuilt from, so resumed runs can skip the month)
+        output_path = get_point_csv_path(year, month_name)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        write_point_csv(clean_points, output_path)
 
-        # If all required fields are valid, copy feature to clean layer
-        clean_feat = QgsFeature()
-        clean_feat.setGeometry(feat.geometry())
-        clean_feat.setAttributes(feat.attributes())
-        clean_provider.addFeature(clean_feat)
+    # Confirm if the file was saved successfully
+    if output_path is not None:
+        if os.path.exists(output_path):
+            logging.info(f"✅ Cleaned sampled points saved to: {output_path}")
+        else:
+            logging.info("❌ Failed to save the cleaned sampled points.")
 
-    logging.info(f"✅ Filtered out {removed} features with missing values.")
-    logging.info(f"📦 Remaining features: {clean_layer.featureCount()}")
+    return output_path
 
-    # Add clean layer to QGIS map view
-    QgsProject.instance().addMapLayer(clean_layer)
 
-    return clean_layer
 
 
-# === Save as CSV ===
-def save_point_file(year, month_name, clean_layer, sampled_output_folder):
-    # Define output CSV file path
-    csv_output_path = os.path.join(sampled_output_folder, f"Cleaned_Sampled_Points_{month_name}{year}.csv")
-    
-    # Write the clean vector layer to CSV, including point geometry as X,Y coordinates
-    QgsVectorFileWriter.writeAsVectorFormat(
-        clean_layer, csv_output_path, "UTF-8", clean_layer.crs(), "CSV", layerOptions=['GEOMETRY=AS_XY']
+
+# -- Keys of a year's and a month's stages
+def partition_stage_key(year):
+    # The year's hotspot partition depends on its hotspot shapefile, the BC boundary and the point-in-BC mask
+    return runner.node_key(
+        'partition', inputs=[get_hotspot_path(year), reprojected_bc_boundary],
+        params={'target_crs': 'EPSG:3347', 'bc_mask_resolution': bc_mask_resolution}
     )
 
-    # Confirm if the file was saved successfully
-    if os.path.exists(csv_output_path):
-        logging.info(f"✅ Cleaned attribute table saved to CSV: {csv_output_path}")
-    else:
-        logging.info("❌ Failed to save CSV file.")
-        
-    return csv_output_path
 
+def month_stage_keys(year, month_name, climate_stack):
+    """
+    Computes the key of every stage of a month, in pipeline order, without running anything.
+    Each stage's key includes the keys of the stages it reads from, so a changed hotspot file,
+    climate raster, fuel raster or parameter invalidates that stage and all the stages after it.
+
+    Returns:
+    - dict: Key of the 'non_fire', 'merge', 'sampling', 'cleaning' and 'export' stages.
+    """
+    keys = {}
+    keys['non_fire'] = runner.node_key('non_fire', inputs=[reprojected_bc_boundary], upstream=[partition_keys[year]], params={
+        'count': non_fire_counts[(year, month_name)], 'sampler': non_fire_sampler,
+        'exclusion_distance': non_fire_exclusion_distance, 'random_seed': random_seed
+    })
+    keys['merge'] = runner.node_key('merge', upstream=[partition_keys[year], keys['non_fire']])
+
+    # The month's own datacube checksum, so rebuilding the datacube only reruns the months whose values changed
+    # (a datacube without checksums is hashed as a whole)
+    climate_inputs = [climate_stack]
+    datacube_checksum = None
+    if climate_cube is not None:
+        month_num = {name: num for num, name in month_words.items()}[month_name]
+        if climate_cube['checksums'] is not None:
+            datacube_checksum = climate_cube['checksums'].get(f"{year}-{month_num:02d}")
+        else:
+            climate_inputs += [os.path.join(climate_cube_dir, CUBE_FILE), os.path.join(climate_cube_dir, METADATA_FILE)]
+    keys['sampling'] = runner.node_key('sampling', inputs=climate_inputs + [final_clipped_raster], upstream=[keys['merge']], params={
+        'climate_sampling': climate_sampling, 'datacube_found': climate_cube is not None,
+        'datacube_month': datacube_checksum,
+        'datacube_grid': climate_cube['geotransform'] if climate_cube is not None else None,
+        'climate_interpolation': climate_interpolation
+    })
+    keys['cleaning'] = runner.node_key('cleaning', upstream=[keys['sampling']], params={
+        'fields': CLIMATE_FIELDS + [FUEL_FIELD], 'missing_value': MISSING_VALUE
+    })
+    keys['export'] = runner.node_key('export', upstream=[keys['cleaning']], params={
+        'output_format': output_format, 'dataset': points_dataset_dir if output_format == 'parquet' else None
+    })
+    return keys
 
 
 
 
-#== LOOP THROUGH DIFFERENT YEARS AND MONTHS
-# This loop processes data year by year and month by month, starting from 'start_year' to 'end_year'
-for year in range(start_year, end_year + 1):
-    logging.info(f"Processing {year}...")
-
-    # Load the fire hotspot data (point locations of fires) for the current year
-    hotspot_layer = get_hotspots(year)
-
-    # Reproject the hotspot data to a specific coordinate system (EPSG:3347) for spatial analysis
-    reprojected_hotspot_layer = reproject_hotspot_layer(hotspot_layer, year)
-    # Store reprojected layer in a dictionary to avoid reprocessing later
-    reprojected_hotspot_layers[year] = reprojected_hotspot_layer
-
-    # Now process each month (January to December)
-    for month_num, month_name in month_words.items():
-        # Retrieve the reprojected hotspot layer for the current year
-        reprojected_hotspot_layer = reprojected_hotspot_layers[year]
-
-        # Get the fire points that occurred in this specific month and year, clipped to BC’s boundary
-        fire_points = get_monthly_hotspot_data(month_num, month_name, year, reprojected_hotspot_layer)
-
-        # If no fire points exist for this month, log and skip further fire-related processing
-        if fire_points is None:
-            logging.info(f"⚠️ Skipping {month_name} {year} — no valid hotspot data.")
-            fire_counts[(year, month_name)] = 0
-            non_fire_counts[(year, month_name)] = None
-            continue
 
-        # Count how many fire points were found
-        fire_count = len(fire_points)
-        fire_counts[(year, month_name)] = fire_count
+# -- Run the stages of one month
+def process_month(year, month_num, month_name, month_fires, non_fire_count, climate_stack, return_points=False):
+    """
+    Runs the non-fire, merge, sampling, cleaning and export stages of one month, in the main
+    process or in a worker process. The non-fire points are drawn from a generator seeded with
+    (random_seed, year, month), so a month gives the same points whichever process runs it.
 
-        # Store the fire count (used later to determine how many non-fire points to generate)
-        if fire_count > 0:
-            non_fire_counts[(year, month_name)] = fire_count
-            yearly_fire_counts[year].append(fire_count)
-        else:
-            # Placeholder if there were no fires — we’ll compute an average later
-            non_fire_counts[(year, month_name)] = None
+    Parameters:
+    - month_fires (dict): The month's fire arrays from the year's hotspot partition (None if the year had none).
+    - non_fire_count (int): Number of non-fire points to generate.
+    - climate_stack (str): Path of the month's climate stack (None if it is missing).
+    - return_points (bool): Also return the cleaned points (to show them in QGIS or keep them in memory).
 
-# After first pass, calculate the average monthly fire count for each year (to use when no fires are present)
-yearly_avg_fire = {
-    year: int(round(sum(counts) / len(counts))) if counts else 400
-    for year, counts in yearly_fire_counts.items()
-}
+    Returns:
+    - dict: 'year', 'month_num', 'output_path' of the saved points (None if nothing was saved),
+      'counts' of points after each stage that ran, 'points' and 'error'.
+    """
+    global rng
+    rng = np.random.default_rng([random_seed, year, month_num])
+    result = {'year': year, 'month_num': month_num, 'output_path': None, 'counts': {}, 'points': None, 'error': None}
+
+    # Get fire points for the current year and month
+    fire_points = get_monthly_hotspot_data(month_num, month_name, year, {month_num: month_fires})
+
+    # Continue workflow even if there are no fire points (for balance, we still include non-fire points)
+    if fire_points is None:
+        logging.info(f"ℹ️ No fire points found for {month_name} {year}. Proceeding with non-fire data only.")
+
+    # Step 2: Create random non-fire points equal to the number of fire points or average count
+    # (optionally kept away from this month's fire points)
+    fire_xy = np.column_stack([month_fires['x'], month_fires['y']]) if month_fires else None
+    non_fire_points = gen_non_fire_points(year, month_name, non_fire_count, fire_xy)
+    result['counts']['non_fire'] = point_table_length(non_fire_points)
+
+    # Steps 3 to 5: Combine fire and non-fire points into one table (also saved as a shapefile at the debug artifact level)
+    merged_points = merge_data_points(month_name, year, fire_points, non_fire_points)
+    result['counts']['merge'] = point_table_length(merged_points)
+
+    # Steps 6 and 7: Sample climate and fuel values at each point location
+    sampled_points = point_sampling(month_name, year, merged_points, climate_stack)
+    if sampled_points is None:
+        result['error'] = "sampling failed"
+        return result
+    result['counts']['sampling'] = point_table_length(sampled_points)
+
+    # Step 8: Remove any points with missing or invalid values from the sampled points
+    clean_points = clean_sampled_points(sampled_points)
+    result['counts']['cleaning'] = point_table_length(clean_points)
+
+    # Step 9: Save the final cleaned data (Parquet partition or monthly CSV) for later use in analysis
+    result['output_path'] = save_point_file(year, month_name, clean_points)
+    if return_points:
+        result['points'] = clean_points
+
+    # Step 10: Log progress
+    logging.info(f"Completed processing for {month_name} {year}")
+    return result
+
+
+# === Parallel month processing ===
+def init_worker(bc_boundary_path, fuel_raster, backend_name, fuel_grid_available):
+    # Each worker process sets up its own backend and loads its own BC geometry. It opened its own climate datacube
+    # memory map when it imported this script, and maps the shared fuel grid (built by the main process) on first use.
+    # Without a fuel grid it reads the fuel raster itself.
+    global reprojected_bc_boundary, final_clipped_raster, bc_geometry, fuel_grid
+    if not fuel_grid_available:
+        fuel_grid = False
+    init_processing(backend_name)
+    reprojected_bc_boundary = bc_boundary_path
+    final_clipped_raster = fuel_raster
+    bc_geometry = load_bc_geometry(bc_boundary_path)
+
+
+def run_month_job(*args, **kwargs):
+    # Runs one month and reports any error instead of raising it, so one bad month does not stop the others
+    try:
+        return process_month(*args, **kwargs)
+    except Exception as e:
+        year, month_num = args[0], args[1]
+        return {'year': year, 'month_num': month_num, 'output_path': None, 'counts': {}, 'points': None, 'error': str(e)}
+
+
+def record_month_result(result, stage_keys):
+    # Records the stages a month completed in the year's manifest and collects its points, in job order
+    year, month_num = result['year'], result['month_num']
+    month_name = month_words[month_num]
+    for stage in ('non_fire', 'merge', 'sampling', 'cleaning'):
+        if stage in result['counts']:
+            runner.mark_complete(stage, stage_keys[stage], year, month_num, info={'points': result['counts'][stage]})
+    output_path = result['output_path']
+    if output_path is not None and os.path.exists(output_path):
+        runner.mark_complete('export', stage_keys['export'], year, month_num, outputs={'points': output_path})
+    runner.flush(year)  # The month is recorded as soon as it is collected, so a crash only loses unfinished months
+
+    if result['error'] is not None:
+        logging.info(f"❌ {month_name} {year} failed: {result['error']}")
+    if result['points'] is not None:
+        if artifact_level == 'none':
+            all_clean_points.append(result['points'])
+        # Add the clean points to the QGIS map view when asked to
+        if load_layers_into_qgis:
+            from qgis.core import QgsProject
+            QgsProject.instance().addMapLayer(point_table_to_layer(result['points'], f"Cleaned Sampled Points {month_name} {year}"))
+
+
+def month_jobs():
+    """
+    Lists the months of the selected years that have to run, in (year, month) order, skipping the
+    months whose export is complete and none of whose stages' inputs or parameters changed.
+    Only the export is saved at the default artifact level, so the earlier stages of an
+    invalidated month run again from the year's hotspot partition.
 
-# For each month, if no fires occurred, set non-fire count to that year’s average
-# (or fallback to 400 if there’s no data at all)
-for (year, month_name), count in fire_counts.items():
-    if count > 0:
-        non_fire_counts[(year, month_name)] = count
-    else:
-        non_fire_counts[(year, month_name)] = yearly_avg_fire.get(year, 400)
+    Yields:
+    - (tuple, dict): process_month() arguments and the month's stage keys.
+    """
+    for year in selected_years:
+        monthly_hotspots = None  # The first-pass monthly fire sets, loaded when a month of the year has to run
 
-# Initialize a list to store paths to all final CSV outputs
-all_csv_paths = []
+        for month_num, month_name in month_words.items():
+            if month_num not in selected_months:
+                continue
 
-# === Second pass: process each month’s data with full logic now that we know how many non-fire points to use
-for year in range(start_year, end_year + 1):
-    logging.info(f"Processing {year}...")
+            climate_stack = get_climate_raster_path(year, month_name)
+            stage_keys = month_stage_keys(year, month_name, climate_stack)
+            if runner.completed('export', stage_keys['export'], year, month_num) is not None:
+                logging.info(f"ℹ️ {month_name} {year}: Already complete, skipped.")
+                continue
+            stale_stages = runner.stale_stages(stage_keys, year, month_num)
+            if runner.enabled and stale_stages:
+                logging.info(f"🔁 {month_name} {year}: Running from the '{stale_stages[0]}' stage.")
 
-    # Load hotspot shapefile again for this year
-    hotspot_layer = get_hotspots(year)
+            # Reuse the monthly fire sets from the first pass (no second load, filter or clip of the hotspots)
+            if monthly_hotspots is None:
+                monthly_hotspots = load_monthly_hotspots(year)
+            month_fires = monthly_hotspots[month_num] if monthly_hotspots else None
 
-    for month_num, month_name in month_words.items():
-        # Get the already-reprojected hotspot layer for this year
-        reprojected_hotspot_layer = reprojected_hotspot_layers[year]
+            args = (year, month_num, month_name, month_fires, non_fire_counts[(year, month_name)], climate_stack)
+            yield args, stage_keys
 
-        # Get fire points for the current year and month
-        fire_points = get_monthly_hotspot_data(month_num, month_name, year, reprojected_hotspot_layer)
 
-        # Continue workflow even if there are no fire points (for balance, we still include non-fire points)
-        if fire_points is None:
-            logging.info(f"ℹ️ No fire points found for {month_name} {year}. Proceeding with non-fire data only.")
+def run_parallel_months(workers):
+    """
+    Spreads the months over a pool of worker processes. Every month is independent once the
+    non-fire counts are known; results are collected in (year, month) order, not completion order,
+    so the manifests, the in-memory points and the QGIS layers come out the same for any worker count.
+    """
+    return_points = load_layers_into_qgis or artifact_level == 'none'
 
-        # Step 2: Create random non-fire points equal to the number of fire points or average count
-        non_fire_count = non_fire_counts[(year, month_name)]
-        layer, common_fields, transformer, target_crs = gen_non_fire_points(year, month_name, non_fire_count)
+    # Only this process builds the fuel grid; the workers are told whether it exists instead of trying themselves
+    fuel_grid_available = get_fuel_grid() is not None
 
-        # Step 3: Clean and standardize the fire point attributes (e.g., extract date, coordinates)
-        cleaned_layer = rebuild_hotspot_clean_copy(fire_points, common_fields)
+    # 'spawn' gives every worker a clean GDAL/QGIS state instead of a forked copy of ours
+    mp_context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=init_worker,
+                             initargs=(reprojected_bc_boundary, final_clipped_raster, backend.name, fuel_grid_available)) as executor:
+        jobs = []
+        for args, stage_keys in month_jobs():
+            try:
+                jobs.append((args, executor.submit(run_month_job, *args, return_points=return_points), stage_keys))
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory) and the pool accepts no more jobs
+                jobs.append((args, None, stage_keys))
 
-        # Step 4: Ensure fire data is properly formatted and lat/lon values are recalculated
-        reordered_hotspot = reorder_hotspots(cleaned_layer, layer, transformer, common_fields)
+        for args, future, stage_keys in jobs:
+            try:
+                if future is None:
+                    raise BrokenProcessPool("worker pool stopped before the month was submitted")
+                result = future.result()
+            except BrokenProcessPool as e:
+                # The month's worker died before it could report back: the month failed and none of its stages completed
+                year, month_num = args[0], args[1]
+                result = {'year': year, 'month_num': month_num, 'output_path': None, 'counts': {}, 'points': None,
+                          'error': f"worker process terminated abruptly ({e})"}
+            record_month_result(result, stage_keys)
 
-        # Step 5: Combine fire and non-fire points into a single shapefile for further analysis
-        merged_layer = merge_data_points(month_name, year, month_num, reordered_hotspot, layer, common_fields, target_crs)
 
-        # Step 6: Load the climate raster file for this month and year
-        climate_stack = get_climate_raster_path(year, month_name)
 
-        # Step 7: Sample climate and fuel values at each point location
-        sampled_layer, _, sampled_output_folder = point_sampling(month_name, year, merged_layer, climate_stack)
 
-        # Step 8: Remove any points with missing or invalid values from the sampled layer
-        clean_layer = clean_sampled_layer(sampled_layer)
 
-        # Step 9: Save the final cleaned data as a CSV file for later use in analysis
-        csv_output_path = save_point_file(year, month_name, clean_layer, sampled_output_folder)
-        all_csv_paths.append(csv_output_path)
+#== LOOP THROUGH DIFFERENT YEARS AND MONTHS
+if __name__ == "__main__":
+    init_processing()
+    preprocessed = prepare_inputs()
+    if preprocessed is None:
+        sys.exit(1)
+    reprojected_bc_boundary = preprocessed['bc_boundary_3347']
+    final_clipped_raster = preprocessed['fuel_raster']
+    bc_geometry = load_bc_geometry(reprojected_bc_boundary)
+
+    # This loop processes data year by year and month by month, for the years selected between 'start_year' and 'end_year'
+    partition_keys = {}  # year -> key of the year's hotspot partition
+
+    for year in selected_years:
+        logging.info(f"Processing {year}...")
+
+        # Reuse the year's partition from an earlier run when its hotspot file and parameters are unchanged
+        partition_keys[year] = partition_stage_key(year)
+        partition = runner.completed('partition', partition_keys[year], year)
+        if partition is not None:
+            monthly_hotspot_cache[year] = partition['outputs']['hotspots']  # Loaded from its .npz file by the second pass
+            month_fire_counts = {int(month_num): count for month_num, count in partition['info']['fire_counts'].items()}
+            logging.info(f"ℹ️ {year}: Reusing the hotspot partition from an earlier run.")
+        else:
+            # Load the fire hotspot data (point locations of fires) for the current year
+            hotspot_path = get_hotspots(year)
+
+            # Reproject the hotspot data to a specific coordinate system (EPSG:3347) for spatial analysis
+            reprojected_hotspot_path = reproject_hotspot_layer(hotspot_path, year)
+
+            # Read the year's hotspots once, clipped to BC’s boundary and split into months, and keep them for the second pass
+            # (the reprojected file is not needed after this, so an in-memory copy is freed)
+            monthly_hotspots = partition_hotspots_by_month(year, reprojected_hotspot_path)
+            cache_path = cache_monthly_hotspots(year, monthly_hotspots)
+            release_intermediate(reprojected_hotspot_path)
+
+            month_fire_counts = {
+                month_num: len(monthly_hotspots[month_num]['x']) if monthly_hotspots else 0 for month_num in month_words
+            }
+            if cache_path is not None:
+                runner.mark_complete('partition', partition_keys[year], year,
+                                     outputs={'hotspots': cache_path}, info={'fire_counts': month_fire_counts})
+                runner.flush(year)
+
+        # Now process each month (January to December)
+        for month_num, month_name in month_words.items():
+            # Count the fire points that occurred in this specific month and year
+            fire_count = month_fire_counts.get(month_num, 0)
+
+            # If no fire points exist for this month, log and skip further fire-related processing
+            if fire_count == 0:
+                logging.info(f"⚠️ Skipping {month_name} {year} — no valid hotspot data.")
+                fire_counts[(year, month_name)] = 0
+                non_fire_counts[(year, month_name)] = None
+                continue
 
-        # Step 10: Log progress
-        logging.info(f"Completed processing for {month_name} {year}")
+            # Store how many fire points were found
+            fire_counts[(year, month_name)] = fire_count
 
+            # Store the fire count (used later to determine how many non-fire points to generate)
+            if fire_count > 0:
+                non_fire_counts[(year, month_name)] = fire_count
+                yearly_fire_counts[year].append(fire_count)
+            else:
+                # Placeholder if there were no fires — we’ll compute an average later
+                non_fire_counts[(year, month_name)] = None
 
+    # After first pass, calculate the average monthly fire count for each year (to use when no fires are present)
+    yearly_avg_fire = {
+        year: int(round(sum(counts) / len(counts))) if counts else 400
+        for year, counts in yearly_fire_counts.items()
+    }
 
+    # For each month, if no fires occurred, set non-fire count to that year’s average
+    # (or fallback to 400 if there’s no data at all)
+    for (year, month_name), count in fire_counts.items():
+        if count > 0:
+            non_fire_counts[(year, month_name)] = count
+        else:
+            non_fire_counts[(year, month_name)] = yearly_avg_fire.get(year, 400)
 
-# Combine all sampled monthly data into one CSV
+    # === Second pass: process each month’s data with full logic now that we know how many non-fire points to use
+    # The BC membership raster, triangles and fuel grid are built (or loaded) here, before any worker needs them
+    get_bc_mask()
+    if non_fire_sampler == 'triangulation':
+        get_bc_triangles()
+    get_fuel_grid()
+
+    if point_workers > 1:
+        run_parallel_months(point_workers)
+    else:
+        return_points = load_layers_into_qgis or artifact_level == 'none'
+        for args, stage_keys in month_jobs():
+            record_month_result(run_month_job(*args, return_points=return_points), stage_keys)
 
-# Set the full path for the final combined CSV file
-combined_csv_path = os.path.join(base_dir, f"Point_data/Sampled/Combined_Sampled_Points_{start_year}-{end_year}.csv")
 
-# Open the output file in write mode (this will create the file if it doesn't exist)
-with open(combined_csv_path, 'w', newline='') as combined_file:
-    writer = csv.writer(combined_file)  # Create a CSV writer object
-    header_written = False  # Track whether the header (column names) has been written yet
 
-    # Loop through the list of all monthly CSV paths previously generated
-    for path in all_csv_paths:
-        # Check that the file actually exists (some months may have been skipped)
-        if os.path.exists(path):
-            with open(path, 'r') as infile:
-                reader = csv.reader(infile)  # Create a CSV reader for the current file
-                header = next(reader)  # Read the first row as the header
-                if not header_written:
-                    writer.writerow(header)  # Write the header to the combined file only once
-                    header_written = True
-                for row in reader:
-                    writer.writerow(row)  # Write each data row to the final CSV
 
-# Log a message once everything is done
-logging.info(f"All data processing complete. Combined CSV saved as 'Complete_Sampled_Data_{start_year}-{end_year}.csv'")
+    # Combine all sampled monthly data into one CSV
+    # (Parquet output needs no combining: the partitioned dataset is read as one table)
+    if artifact_level == 'none':
+        combined_points = concat_point_tables(*all_clean_points)
+        logging.info(f"All data processing complete. {point_table_length(combined_points)} sampled points kept in memory (nothing saved).")
+    elif output_format == 'parquet':
+        logging.info(f"All data processing complete. Sampled points dataset saved in '{points_dataset_dir}'")
+    else:
+        # Set the full path for the final combined CSV file
+        combined_csv_path = os.path.join(base_dir, f"Point_data/Sampled/Combined_Sampled_Points_{start_year}-{end_year}.csv")
+
+        # Open the output file in write mode (this will create the file if it doesn't exist)
+        with open(combined_csv_path, 'w', newline='') as combined_file:
+            writer = csv.writer(combined_file)  # Create a CSV writer object
+            header_written = False  # Track whether the header (column names) has been written yet
+
+            # Loop through the monthly CSVs of every year, including the months completed by earlier runs
+            for year in range(start_year, end_year + 1):
+                for month_name in month_words.values():
+                    path = get_point_csv_path(year, month_name)
+                    # Check that the file actually exists (some months may have been skipped)
+                    if not os.path.exists(path):
+                        continue
+                    with open(path, 'r') as infile:
+                        reader = csv.reader(infile)  # Create a CSV reader for the current file
+                        header = next(reader)  # Read the first row as the header
+                        if not header_written:
+                            writer.writerow(header)  # Write the header to the combined file only once
+                            header_written = True
+                        for row in reader:
+                            writer.writerow(row)  # Write each data row to the final CSV
+
+        # Log a message once everything is done
+        logging.info(f"All data processing complete. Combined CSV saved as '{combined_csv_path}'")
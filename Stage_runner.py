@@ -0,0 +1,130 @@
+# Resumable stage runner for the year/month loops of the pipeline scripts
+# Every stage of a year (or of a month in that year) is a node with a key. Finished nodes are recorded in a
+# completion manifest per year, so a rerun skips the nodes whose key is unchanged and whose outputs still exist.
+import os
+import json
+import argparse
+from Preprocessing_stage import file_hash, shapefile_parts, content_key  # Same input hashing as the preprocessing stage
+
+
+HASH_CACHE_FILE = 'file_hashes.json'  # Input file hashes, reused while size and mtime are unchanged
+
+
+# -- Pick the years and months to run from the command line
+def parse_selection(text, first, last):
+    # Reads "2024", "2019-2021" or "2000,2005-2007" into a sorted list of values between first and last
+    if not text:
+        return list(range(first, last + 1))
+    values = set()
+    for part in text.split(','):
+        start, _, end = part.strip().partition('-')
+        values.update(range(int(start), int(end or start) + 1))
+    return sorted(value for value in values if first <= value <= last)
+
+
+def parse_run_arguments(argv, start_year, end_year):
+    """
+    Reads the --years, --months and --force options (e.g. --years 2024 --months 8 to redo August 2024 only).
+    Unknown arguments are ignored, so the scripts still run from the QGIS Python console.
+
+    Returns:
+    - (list, list, bool): Selected years, selected month numbers, and whether complete nodes are rerun anyway.
+    """
+    arg_parser = argparse.ArgumentParser(add_help=False)
+    arg_parser.add_argument('--years', default=None)
+    arg_parser.add_argument('--months', default=None)
+    arg_parser.add_argument('--force', action='store_true')
+    args, _ = arg_parser.parse_known_args(argv)
+    return parse_selection(args.years, start_year, end_year), parse_selection(args.months, 1, 12), args.force
+
+
+class StageRunner:
+    """
+    Keeps the completion manifests of the (year, month) stage nodes.
+
+    A node's key covers the hashes of its input files, the keys of the nodes it reads from and its
+    parameters, so a changed input or parameter invalidates the node and every node downstream of it.
+    Manifests are JSON files named after the year, written with a rename so a crash never leaves one half written.
+    With enabled=False nothing is recorded and every node runs.
+    """
+
+    def __init__(self, manifest_dir, enabled=True, force=False):
+        self.manifest_dir = manifest_dir
+        self.enabled = enabled
+        self.force = force
+        self.manifests = {}  # year -> {node name: {'key', 'outputs', 'info'}}
+        self.hash_cache = {}
+        if enabled:
+            os.makedirs(manifest_dir, exist_ok=True)
+            hash_cache_path = os.path.join(manifest_dir, HASH_CACHE_FILE)
+            if os.path.exists(hash_cache_path):
+                with open(hash_cache_path, 'r') as f:
+                    self.hash_cache = json.load(f)
+
+    # -- Node keys
+    def input_hashes(self, paths):
+        # Content hash of each input file ('missing' for files that do not exist); a shapefile counts all of its parts
+        hashes = []
+        for path in paths:
+            if not path or not os.path.exists(path):
+                hashes.append('missing')
+                continue
+            parts = shapefile_parts(path) if path.lower().endswith('.shp') else [path]
+            hashes.append([file_hash(part, self.hash_cache) for part in parts])
+        return hashes
+
+    def node_key(self, stage, inputs=(), upstream=(), params=None):
+        return content_key({'stage': stage, 'files': self.input_hashes(inputs), 'upstream': list(upstream)}, params or {})
+
+    # -- Completion manifests
+    @staticmethod
+    def node_name(stage, month_num=None):
+        return stage if month_num is None else f"{month_num:02d}/{stage}"
+
+    def manifest(self, year):
+        if year not in self.manifests:
+            manifest_path = os.path.join(self.manifest_dir, f"{year}.json")
+            nodes = {}
+            if self.enabled and os.path.exists(manifest_path):
+                with open(manifest_path, 'r') as f:
+                    nodes = json.load(f)['nodes']
+            self.manifests[year] = nodes
+        return self.manifests[year]
+
+    def completed(self, stage, key, year, month_num=None):
+        """
+        Returns the manifest entry of a node that does not need to run again: same key, and every recorded
+        output file still exists. None if the node has to run (or the runner is disabled or forced).
+        """
+        if not self.enabled or self.force:
+            return None
+        entry = self.manifest(year).get(self.node_name(stage, month_num))
+        if entry is None or entry['key'] != key:
+            return None
+        if not all(os.path.exists(path) for path in entry['outputs'].values()):
+            return None
+        return entry
+
+    def stale_stages(self, keys, year, month_num=None):
+        # Stages (in the order of keys) whose recorded key differs from the new one, or that never completed
+        nodes = self.manifest(year)
+        return [stage for stage, key in keys.items()
+                if nodes.get(self.node_name(stage, month_num), {}).get('key') != key]
+
+    def mark_complete(self, stage, key, year, month_num=None, outputs=None, info=None):
+        # Records a finished node in memory; flush() writes the year's manifest
+        if self.enabled:
+            self.manifest(year)[self.node_name(stage, month_num)] = {
+                'key': key, 'outputs': outputs or {}, 'info': info or {}
+            }
+
+    def flush(self, year):
+        if not self.enabled:
+            return
+        manifest_path = os.path.join(self.manifest_dir, f"{year}.json")
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump({'year': year, 'nodes': self.manifest(year)}, f, indent=2, sort_keys=True)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+        with open(os.path.join(self.manifest_dir, HASH_CACHE_FILE), 'w') as f:
+            json.dump(self.hash_cache, f, indent=2)